@@ -1,5 +1,12 @@
-from django.contrib import admin
-from core.models import HeroImage, TerritoryImage, AboutImage, Recipient, Slip, Retailer
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.db.models import Count
+from django.http import HttpResponseRedirect
+from django.template.response import TemplateResponse
+from django.urls import reverse
+from core.models import HeroImage, TerritoryImage, AboutImage, Recipient, Slip, Retailer, PrintJob, SlipItem, SlipNumberSequence
+from user_profile.recipient_duplicates import find_duplicate_groups, merge_recipients, pick_merge_target
+from user_profile.slip_search import matching_slips
 
 @admin.register(TerritoryImage)
 class TerritoryImageAdmin(admin.ModelAdmin):
@@ -20,7 +27,8 @@ class RetailerAdmin(admin.ModelAdmin):
 
 @admin.register(Recipient)
 class RecipientAdmin(admin.ModelAdmin):
-    list_display = ('company_name', 'city', 'province_sigla', 'country', 'email', 'created_by')
+    list_display = ('company_name', 'city', 'postal_code', 'vat_number', 'province_sigla', 'country', 'email', 'created_by')
+    actions = ['show_duplicates', 'merge_selected']
     search_fields = ('company_name', 'city', 'vat_number')
     list_filter = ('created_by', 'country')
     fieldsets = (
@@ -29,11 +37,69 @@ class RecipientAdmin(admin.ModelAdmin):
         }),
     )
 
+    @admin.action(description="Mostra i possibili duplicati tra i selezionati")
+    def show_duplicates(self, request, queryset):
+        groups = find_duplicate_groups(queryset)
+        if not groups:
+            self.message_user(request, "Nessun duplicato trovato.", messages.INFO)
+            return None
+        for group in groups:
+            names = ", ".join(str(r) for r in Recipient.objects.filter(pk__in=group))
+            self.message_user(request, f"Possibili duplicati: {names}", messages.WARNING)
+        pks = ",".join(str(pk) for group in groups for pk in group)
+        return HttpResponseRedirect(f"{reverse('admin:core_recipient_changelist')}?id__in={pks}")
+
+    @admin.action(description="Unisci i destinatari selezionati", permissions=['change', 'delete'])
+    def merge_selected(self, request, queryset):
+        # Like delete_selected, nothing is merged until the confirmation page is posted
+        if queryset.count() < 2:
+            self.message_user(request, "Seleziona almeno due destinatari da unire.", messages.ERROR)
+            return None
+        target = pick_merge_target(queryset.values_list('pk', flat=True))
+        duplicates = list(queryset.exclude(pk=target.pk).annotate(slip_count=Count('slips')).order_by('pk'))
+
+        if request.POST.get('post'):
+            moved = merge_recipients(target, duplicates)
+            self.message_user(
+                request,
+                f"{len(duplicates)} destinatari uniti in \"{target}\", {moved} bolle spostate.",
+                messages.SUCCESS,
+            )
+            return None
+
+        detected = next((set(group) for group in find_duplicate_groups(queryset) if target.pk in group), set())
+        context = {
+            **self.admin_site.each_context(request),
+            'title': "Unire i destinatari selezionati?",
+            'opts': self.model._meta,
+            'target': target,
+            'duplicates': [(recipient, recipient.pk in detected) for recipient in duplicates],
+            'all_duplicates': all(recipient.pk in detected for recipient in duplicates),
+            'moved_count': sum(recipient.slip_count for recipient in duplicates),
+            'queryset': queryset,
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+            'media': self.media,
+        }
+        request.current_app = self.admin_site.name
+        return TemplateResponse(request, 'admin/core/recipient/merge_selected_confirmation.html', context)
+
+class SlipItemInline(admin.TabularInline):
+    model = SlipItem
+    fields = ('position', 'description', 'quantity', 'unit', 'note')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 @admin.register(Slip)
 class SlipAdmin(admin.ModelAdmin):
-    list_display = ('slip_number', 'date', 'recipient', 'lavorazione', 'get_total_quantity')
+    list_display = ('slip_number', 'date', 'recipient', 'lavorazione', 'item_count', 'total_quantity')
     list_filter = ('date', 'recipient', 'created_by')
-    search_fields = ('slip_number', 'recipient__company_name', 'items')
+    search_fields = ('slip_number', 'recipient__company_name')
+    # Read-only copy of the items JSON, kept in sync by Slip.save()
+    inlines = [SlipItemInline]
     fieldsets = (
         (None, {
             'fields': ('slip_number', 'date', 'recipient', 'lavorazione', 'resp_spedizione', 'data_trasp', 'aspetto', 'notes', 'created_by')
@@ -44,7 +110,23 @@ class SlipAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_search_results(self, request, queryset, search_term):
+        # Served by the slip search index instead of a LIKE over every field
+        if not search_term:
+            return queryset, False
+        return matching_slips(search_term, queryset), False
+
     def save_model(self, request, obj, form, change):
         if not obj.created_by_id:
             obj.created_by = request.user
-        super().save_model(request, obj, form, change)
\ No newline at end of file
+        super().save_model(request, obj, form, change)
+
+@admin.register(PrintJob)
+class PrintJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'created_by', 'status', 'total', 'processed', 'failed', 'created_at', 'finished_at')
+    list_filter = ('status', 'created_by')
+    readonly_fields = ('slip_ids', 'total', 'processed', 'failed', 'file_path', 'error', 'heartbeat', 'created_at', 'finished_at')
+
+@admin.register(SlipNumberSequence)
+class SlipNumberSequenceAdmin(admin.ModelAdmin):
+    list_display = ('year', 'next_number')
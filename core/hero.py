@@ -0,0 +1,82 @@
+# file: core/hero.py
+import random
+import threading
+
+from django.core.cache import cache
+from django.db import connection
+
+from .image_resize import get_srcset
+from .models import HeroImage
+
+HERO_CANDIDATES_KEY = "hero-candidates"
+
+# Candidate field -> HeroImage spec it points to
+HERO_SPECS = {
+    "desktop": "hero_desktop",
+    "mobile": "hero_mobile",
+    "desktop_avif": "hero_desktop_avif",
+    "mobile_avif": "hero_mobile_avif",
+}
+
+
+def build_hero_candidates(generate=False):
+    """
+    Returns the URLs of every hero image's derivatives. URLs are read from the
+    storage rather than through the spec's .url, which would generate a
+    missing derivative on the spot. Heroes with a derivative still missing are
+    left out, unless generate is set, which creates them first.
+    """
+    candidates = []
+    for hero in HeroImage.objects.exclude(original_image="").order_by("pk"):
+        candidate = {"id": hero.pk}
+        for key, spec_name in HERO_SPECS.items():
+            file = getattr(hero, spec_name)
+            if not file.storage.exists(file.name):
+                if not generate:
+                    break
+                file.generate(force=True)
+            candidate[key] = file.storage.url(file.name)
+        else:
+            candidate["srcset"] = get_srcset(hero, "hero", "webp")
+            candidate["srcset_avif"] = get_srcset(hero, "hero", "avif")
+            candidates.append(candidate)
+    return candidates
+
+
+def get_hero_candidates():
+    """
+    Returns the hero candidates, from the cache when possible. Requests never
+    generate derivatives: on a cache miss only the heroes whose derivatives
+    exist are listed, and the missing ones are generated in the background.
+    """
+    candidates = cache.get(HERO_CANDIDATES_KEY)
+    if candidates is None:
+        candidates = build_hero_candidates()
+        cache.set(HERO_CANDIDATES_KEY, candidates, None)
+        if len(candidates) < HeroImage.objects.exclude(original_image="").count():
+            refresh_hero_candidates()
+    return candidates
+
+
+def refresh_hero_candidates():
+    """
+    Generates the missing hero derivatives in a background thread, then
+    replaces the cached candidates. Run after a HeroImage change is committed.
+    """
+    def run():
+        try:
+            cache.set(HERO_CANDIDATES_KEY, build_hero_candidates(generate=True), None)
+        except Exception as e:
+            print(f"Error refreshing the hero candidates: {e}")
+        finally:
+            connection.close()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def invalidate_hero_candidates():
+    cache.delete(HERO_CANDIDATES_KEY)
+
+
+def pick_hero(candidates):
+    return random.choice(candidates) if candidates else None
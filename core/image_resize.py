@@ -0,0 +1,239 @@
+# file: core/image_resize.py
+import hashlib
+import io
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+from product_collections.models import ItemImage
+from user_profile.render_limits import InFlightRenders, RenderGate
+from .models import AboutImage, HeroImage, TerritoryImage
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; concurrent generation is then only collapsed per process
+    fcntl = None
+
+# Image models served by the resize endpoint, with the width/height ratio their
+# pictures are cropped to, matching their ImageSpecFields
+RESIZE_KINDS = {
+    "hero": (HeroImage, 16 / 9),
+    "about": (AboutImage, 2 / 3),
+    "territory": (TerritoryImage, 3 / 2),
+    "item": (ItemImage, 3 / 4),
+}
+
+# URL extension -> (PIL format, content type, save options)
+RESIZE_FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80}),
+    "avif": ("AVIF", "image/avif", {"quality": 55}),
+    "jpg": ("JPEG", "image/jpeg", {"quality": 85, "optimize": True, "progressive": True}),
+}
+
+
+def get_version(image_field):
+    """
+    Short hash of the stored original's name. It is part of the resized image
+    URLs, so a new upload gets new URLs and the old ones can be cached forever.
+    """
+    return hashlib.sha256(image_field.name.encode("utf-8")).hexdigest()[:12]
+
+
+def get_srcset(image, kind, image_format):
+    """
+    Returns a srcset listing the image at every width of the resize endpoint.
+    """
+    version = get_version(image.original_image)
+    return ", ".join(
+        f"{reverse('resized_image', args=[kind, image.pk, version, width, image_format])} {width}w"
+        for width in settings.IMAGE_RESIZE_WIDTHS
+    )
+
+
+def resize_image(source, width, ratio, image_format):
+    """
+    Crops an image to ratio and scales it to width, never enlarging it.
+    Returns the encoded bytes.
+    """
+    pil_format, _, options = RESIZE_FORMATS[image_format]
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        width = min(width, image.width, round(image.height * ratio))
+        height = max(round(width / ratio), 1)
+        image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+        if pil_format == "JPEG" and image.mode == "RGBA":
+            image = image.convert("RGB")
+        output = io.BytesIO()
+        image.save(output, pil_format, **options)
+    return output.getvalue()
+
+
+class ResizedImageCache:
+    """
+    On-disk cache of resized images, keyed by kind, pk, original version, width
+    and format. The least recently used entries are evicted once the cache grows
+    past max_bytes.
+
+    Generation is single-flight: concurrent requests for the same missing image
+    in this process wait for the first one (InFlightRenders), and other
+    processes wait on a per-key flock before checking the disk again. The
+    image is opened while that lock is held, so it cannot be evicted between
+    being written and being served.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.in_flight = InFlightRenders()
+
+    def path_for(self, key):
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:2], f"{digest}.{key.rsplit('.', 1)[-1]}")
+
+    def open_or_generate(self, key, generate):
+        """
+        Returns the cached image for key opened for reading, generating it first
+        when missing. The file is opened before the cache is checked rather than
+        after, so an eviction in between cannot make the caller fail: once open,
+        the image stays readable even if it is removed.
+        """
+        path = self.path_for(key)
+        while True:
+            file = self._open(path)
+            if file is not None:
+                return file
+            generated = []
+            self.in_flight.run(key, lambda: generated.append(self._generate(path, generate)))
+            if generated:
+                return generated[0]
+            # Another thread generated it; it may have been evicted already, then start over
+
+    def _generate(self, path, generate):
+        lock_file = self._lock(path)
+        try:
+            # Another process may have written it while this one waited for the lock
+            file = self._open(path)
+            if file is None:
+                self._write_atomic(path, generate())
+                file = open(path, "rb")
+        finally:
+            self._unlock(lock_file)
+        self.evict()
+        return file
+
+    def evict(self):
+        """
+        Removes the least recently used images until the cache fits in max_bytes.
+        """
+        entries = []
+        total = 0
+        for root, dirs, files in os.walk(self.directory):
+            for fname in files:
+                if fname.endswith((".lock", ".tmp")):
+                    continue
+                path = os.path.join(root, fname)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            self._remove(f"{path}.lock")
+            total -= size
+
+    @staticmethod
+    def _open(path):
+        try:
+            file = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        # Touch the entry so eviction sees it as recently used
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return file
+
+    @staticmethod
+    def _lock(path):
+        if fcntl is None:
+            return None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        lock_file = open(f"{path}.lock", "a+b")
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    @staticmethod
+    def _unlock(lock_file):
+        if lock_file is None:
+            return
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            lock_file.close()
+
+    def _write_atomic(self, path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(temp_path, path)
+        except Exception:
+            self._remove(temp_path)
+            raise
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_resized_image_cache():
+    """
+    Returns the process-wide resized image cache.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResizedImageCache(
+                settings.IMAGE_RESIZE_CACHE_DIR, settings.IMAGE_RESIZE_CACHE_MAX_BYTES
+            )
+        return _cache
+
+
+_gate = None
+
+
+def get_resize_gate():
+    """
+    Returns the process-wide limit on concurrent image resizes. Decoding and
+    encoding a large original takes a lot of CPU and memory, so a burst of
+    requests for uncached widths waits in line instead of running all at once.
+    """
+    global _gate
+    with _cache_lock:
+        if _gate is None:
+            _gate = RenderGate(settings.IMAGE_RESIZE_MAX_CONCURRENCY)
+        return _gate
@@ -0,0 +1,112 @@
+# file: core/image_warmup.py
+import os
+import threading
+import time
+from multiprocessing import Pool
+
+from django.apps import apps
+from django.db import connections
+from imagekit.models.fields.utils import ImageSpecFileDescriptor
+
+# Models with ImageSpecFields, as "app_label.ModelName"
+IMAGE_MODELS = (
+    "core.TerritoryImage",
+    "core.AboutImage",
+    "core.HeroImage",
+    "product_collections.ItemImage",
+)
+
+
+def get_spec_names(model):
+    """
+    Returns the names of a model's ImageSpecFields, in definition order.
+    """
+    names = []
+    for klass in reversed(model.__mro__):
+        for name, attr in vars(klass).items():
+            if isinstance(attr, ImageSpecFileDescriptor) and name not in names:
+                names.append(name)
+    return names
+
+
+def get_warmup_tasks(model_labels=IMAGE_MODELS):
+    """
+    Returns one (model label, pk, spec name) task per derivative of every stored image.
+    """
+    tasks = []
+    for label in model_labels:
+        model = apps.get_model(label)
+        spec_names = get_spec_names(model)
+        for pk in model.objects.exclude(original_image="").order_by("pk").values_list("pk", flat=True):
+            tasks.extend((label, pk, spec_name) for spec_name in spec_names)
+    return tasks
+
+
+def generate_derivative(task, force=False):
+    """
+    Generates one derivative unless it already exists. Returns the task with
+    its outcome ("generated", "skipped", "missing" or the error) and the
+    seconds it took.
+    """
+    label, pk, spec_name = task
+    started = time.monotonic()
+    try:
+        instance = apps.get_model(label).objects.filter(pk=pk).first()
+        if instance is None:
+            outcome = "missing"
+        else:
+            file = getattr(instance, spec_name)
+            if not force and file.storage.exists(file.name):
+                outcome = "skipped"
+            else:
+                file.generate(force=True)
+                outcome = "generated"
+    except Exception as e:
+        outcome = f"{type(e).__name__}: {e}"
+    return task, outcome, time.monotonic() - started
+
+
+def _init_worker():
+    # With the spawn start method (macOS, Windows) workers start without Django set up
+    if not apps.ready:
+        import django
+        django.setup()
+
+
+def _generate_task(args):
+    return generate_derivative(*args)
+
+
+def warm_images(tasks, workers=None, force=False):
+    """
+    Generates the derivatives of tasks across a pool of worker processes, yielding
+    each result as it completes. Each derivative is written once it is done,
+    so an interrupted run can simply be started again: it resumes where it left off.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for task in tasks:
+            yield generate_derivative(task, force)
+        return
+
+    # Forked workers must open their own database connections rather than share the parent's
+    connections.close_all()
+    with Pool(workers, initializer=_init_worker) as pool:
+        yield from pool.imap_unordered(_generate_task, [(task, force) for task in tasks])
+
+
+def warm_instance(instance):
+    """
+    Generates the missing derivatives of one image in a background thread, so
+    the upload request does not wait for them.
+    """
+    def run():
+        try:
+            for spec_name in get_spec_names(type(instance)):
+                file = getattr(instance, spec_name)
+                if not file.storage.exists(file.name):
+                    file.generate(force=True)
+        except Exception as e:
+            print(f"Error generating derivatives of {instance!r}: {e}")
+
+    threading.Thread(target=run, daemon=True).start()
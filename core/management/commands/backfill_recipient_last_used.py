@@ -0,0 +1,24 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+
+from core.models import Recipient
+
+
+class Command(BaseCommand):
+    help = 'Sets the last use of every recipient that has none from the date of its latest slip.'
+
+    def handle(self, *args, **options):
+        recipients = (
+            Recipient.objects.filter(last_used_at__isnull=True)
+            .annotate(last_slip_date=Max('slips__date'))
+            .filter(last_slip_date__isnull=False)
+        )
+        updated = []
+        for recipient in recipients.iterator():
+            recipient.last_used_at = timezone.make_aware(datetime.combine(recipient.last_slip_date, time.min))
+            updated.append(recipient)
+        Recipient.objects.bulk_update(updated, ['last_used_at'], batch_size=500)
+        self.stdout.write(self.style.SUCCESS(f'Updated {len(updated)} recipients'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Slip
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the SlipItem rows of every slip from its items JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Slips processed per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        count = 0
+        last_pk = 0
+        while True:
+            batch = list(Slip.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', 'items')[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            with transaction.atomic():
+                for slip in batch:
+                    slip.sync_slip_items()
+            count += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the items of {count} slips'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Slip
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the stored total_quantity and item_count of every slip from its items.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Slips loaded and updated per query')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        updated = 0
+        last_pk = 0
+        while True:
+            batch = list(
+                Slip.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .only('pk', 'items', 'total_quantity', 'item_count')[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            changed = []
+            for slip in batch:
+                total_quantity = slip.get_total_quantity()
+                item_count = len(slip.items or [])
+                if (slip.total_quantity, slip.item_count) != (total_quantity, item_count):
+                    slip.total_quantity = total_quantity
+                    slip.item_count = item_count
+                    changed.append(slip)
+            Slip.objects.bulk_update(changed, ['total_quantity', 'item_count'])
+            updated += len(changed)
+
+        self.stdout.write(self.style.SUCCESS(f'Updated totals of {updated} slips'))
@@ -0,0 +1,102 @@
+import io
+import time
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.image_resize import RESIZE_FORMATS, RESIZE_KINDS, resize_image
+from core.image_warmup import IMAGE_MODELS, get_spec_names
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares the size and generation time of the image formats on stored images: the WebP and AVIF '
+        'versions of the image specs that have both, and every format and width of the resize endpoint.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=5, help='Images sampled per model')
+        parser.add_argument('--skip-specs', action='store_true', help='Only benchmark the resize endpoint')
+        parser.add_argument('--skip-resize', action='store_true', help='Only benchmark the image specs')
+
+    def handle(self, *args, **options):
+        ran = False
+        if not options['skip_specs']:
+            ran |= self.report('spec', self.benchmark_specs(options['limit']), ['WEBP', 'AVIF'])
+        if not options['skip_resize']:
+            formats = [pil_format for pil_format, _, _ in RESIZE_FORMATS.values()]
+            ran |= self.report('resize', self.benchmark_resize(options['limit']), formats)
+        if not ran:
+            self.stdout.write('No stored images to benchmark')
+
+    def benchmark_specs(self, limit):
+        # "model.spec" -> format -> [(bytes, seconds), ...]
+        results = defaultdict(lambda: defaultdict(list))
+        for label in IMAGE_MODELS:
+            model = apps.get_model(label)
+            spec_names = get_spec_names(model)
+            pairs = [(name, f'{name}_avif') for name in spec_names if f'{name}_avif' in spec_names]
+            for instance in model.objects.exclude(original_image='').order_by('-pk')[:limit]:
+                for webp_name, avif_name in pairs:
+                    for spec_name in (webp_name, avif_name):
+                        spec = getattr(instance, spec_name).generator
+                        started = time.perf_counter()
+                        content = spec.generate()
+                        seconds = time.perf_counter() - started
+                        results[f'{label}.{webp_name}'][spec.format].append((len(content.read()), seconds))
+                # Don't keep every original open while sampling the next one
+                instance.original_image.close()
+        return results
+
+    def benchmark_resize(self, limit):
+        # "kind @ width" -> format -> [(bytes, seconds), ...]
+        results = defaultdict(lambda: defaultdict(list))
+        for kind, (model, ratio) in RESIZE_KINDS.items():
+            for instance in model.objects.exclude(original_image='').order_by('-pk')[:limit]:
+                # Read once, so only the resizing and encoding are timed, as on a cache miss
+                with instance.original_image.open('rb') as source:
+                    original = source.read()
+                for width in settings.IMAGE_RESIZE_WIDTHS:
+                    for image_format, (pil_format, _, _) in RESIZE_FORMATS.items():
+                        started = time.perf_counter()
+                        content = resize_image(io.BytesIO(original), width, ratio, image_format)
+                        seconds = time.perf_counter() - started
+                        results[f'{kind} @ {width}w'][pil_format].append((len(content), seconds))
+        return results
+
+    def report(self, title, results, formats):
+        """
+        Prints the average size and time of each format, sizes relative to WebP.
+        Returns False when there was nothing to report.
+        """
+        if not results:
+            return False
+
+        self.stdout.write(f"{title:<45} {'format':<6} {'avg KB':>9} {'avg ms':>9} {'size':>7}")
+        totals = defaultdict(lambda: [0, 0.0])
+        for name, samples_by_format in results.items():
+            webp_bytes = sum(size for size, _ in samples_by_format['WEBP']) or 1
+            for image_format in formats:
+                samples = samples_by_format[image_format]
+                size = sum(s for s, _ in samples)
+                seconds = sum(t for _, t in samples)
+                totals[image_format][0] += size
+                totals[image_format][1] += seconds
+                self.stdout.write(
+                    f'{name:<45} {image_format:<6} {size / len(samples) / 1024:>9.1f} '
+                    f'{seconds / len(samples) * 1000:>9.1f} {size / webp_bytes:>7.0%}'
+                )
+
+        webp_size, webp_seconds = totals['WEBP']
+        for image_format in formats:
+            if image_format == 'WEBP':
+                continue
+            size, seconds = totals[image_format]
+            self.stdout.write(self.style.SUCCESS(
+                f'{title} {image_format}: {size / webp_size:.0%} of the WebP bytes, '
+                f'{seconds / webp_seconds:.1f}x the generation time'
+            ))
+        self.stdout.write('')
+        return True
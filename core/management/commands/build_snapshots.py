@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.snapshots import build_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Renders the public pages to static HTML files with compressed variants, rewriting only the changed ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='URL paths to rebuild, e.g. /retailers/ (default: every public page)')
+
+    def handle(self, *args, **options):
+        results = build_snapshots(options['paths'] or None)
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshots: {results['written']} written, {results['unchanged']} unchanged, "
+            f"{results['removed']} removed, {results['skipped']} skipped"
+        ))
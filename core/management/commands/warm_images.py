@@ -0,0 +1,50 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from core.hero import invalidate_hero_candidates
+from core.image_warmup import IMAGE_MODELS, get_warmup_tasks, warm_images
+
+
+class Command(BaseCommand):
+    help = 'Generates every imagekit derivative of every stored image in parallel, skipping the ones that already exist.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: one per CPU core)')
+        parser.add_argument('--model', action='append', choices=IMAGE_MODELS, help='Only warm this model; may be repeated')
+        parser.add_argument('--force', action='store_true', help='Regenerate derivatives that already exist')
+
+    def handle(self, *args, **options):
+        tasks = get_warmup_tasks(options['model'] or IMAGE_MODELS)
+        self.stdout.write(f'{len(tasks)} derivatives to check')
+
+        started = time.monotonic()
+        outcomes = Counter()
+        generation_times = []
+        for done, (task, outcome, seconds) in enumerate(warm_images(tasks, options['workers'], options['force']), 1):
+            label, pk, spec_name = task
+            if outcome in ('generated', 'skipped', 'missing'):
+                outcomes[outcome] += 1
+            else:
+                outcomes['failed'] += 1
+                self.stderr.write(f'{label} #{pk} {spec_name}: {outcome}')
+            if outcome == 'generated':
+                generation_times.append((seconds, f'{label} #{pk} {spec_name}'))
+            if done % 100 == 0:
+                self.stdout.write(f'{done}/{len(tasks)}')
+
+        elapsed = time.monotonic() - started
+        # Heroes left out of the cached candidates for lack of derivatives can be listed now
+        invalidate_hero_candidates()
+        self.stdout.write(self.style.SUCCESS(
+            f"{outcomes['generated']} generated, {outcomes['skipped']} already present, "
+            f"{outcomes['missing']} missing, {outcomes['failed']} failed in {elapsed:.1f}s"
+        ))
+        if generation_times:
+            total = sum(seconds for seconds, _ in generation_times)
+            self.stdout.write(
+                f'Generation time: {total:.1f}s total, {total / len(generation_times):.2f}s per derivative'
+            )
+            for seconds, name in sorted(generation_times, reverse=True)[:5]:
+                self.stdout.write(f'    {seconds:.2f}s {name}')
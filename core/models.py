@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from imagekit.models import ImageSpecField
 from imagekit.processors import ResizeToFill
 from django.contrib.auth.models import User
@@ -92,6 +92,21 @@ class HeroImage(models.Model):
         format='WEBP',
         options={'quality': 70}
     )
+
+    # AVIF versions of the sizes above, for the <noscript> hero; the other images are
+    # served in every format by the resize endpoint (core/image_resize.py)
+    hero_desktop_avif = ImageSpecField(
+        source='original_image',
+        processors=[ResizeToFill(1920, 1080)],
+        format='AVIF',
+        options={'quality': 60}
+    )
+    hero_mobile_avif = ImageSpecField(
+        source='original_image',
+        processors=[ResizeToFill(1024, 768)],
+        format='AVIF',
+        options={'quality': 50}
+    )
     
     def __str__(self):
         return f"Hero Image - {self.original_image.name}"
@@ -138,11 +153,22 @@ class Recipient(models.Model):
     email = models.EmailField(blank=True, null=True, verbose_name="Email")
     vat_number = models.CharField(max_length=50, blank=True, null=True, verbose_name="Partita IVA / Codice Fiscale")
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recipients', null=True, blank=True)
+    # Normalized name, city and VAT number used by the recipient search, set on save
+    search_key = models.CharField(max_length=512, blank=True, default='', db_index=True, editable=False)
+    # Set whenever a slip for this recipient is saved; recently used recipients are suggested first
+    last_used_at = models.DateTimeField(blank=True, null=True, db_index=True, editable=False, verbose_name="Ultimo utilizzo")
 
     class Meta:
         verbose_name = "Destinatario"
         verbose_name_plural = "Destinatari"
         ordering = ['company_name']
+        indexes = [
+            # Prefix lookups of the recipient autocomplete. MySQL's default collation is
+            # case-insensitive, so istartswith is a plain LIKE 'query%' these can serve
+            models.Index(fields=['company_name'], name='recipient_company_idx'),
+            models.Index(fields=['city'], name='recipient_city_idx'),
+            models.Index(fields=['vat_number'], name='recipient_vat_idx'),
+        ]
 
     def __str__(self):
         return f"{self.company_name} - {self.city}, {self.country}"
@@ -165,6 +191,9 @@ class Slip(models.Model):
     aspetto = models.CharField(max_length=50, blank=True, null=True, verbose_name="Aspetto dei beni")
     
     items = models.JSONField(default=list, verbose_name="Articoli")
+    # Derived from items in save(), so lists and reports never parse the JSON
+    total_quantity = models.FloatField(default=0, db_index=True, editable=False, verbose_name="Quantità Totale")
+    item_count = models.PositiveIntegerField(default=0, db_index=True, editable=False, verbose_name="Numero Articoli")
     notes = models.TextField(blank=True, null=True, verbose_name="Note")
     
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='slips', verbose_name="Creato da")
@@ -174,25 +203,56 @@ class Slip(models.Model):
         verbose_name_plural = "Bolle di Consegna"
         ordering = ['-date', '-slip_number']
         unique_together = ('slip_number', 'slip_year')
+        indexes = [
+            # Dashboard keyset pagination
+            models.Index(fields=['-date', '-slip_number', '-id'], name='slip_date_number_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         # Generate full slip number as combination of slip_number and slip_year
         self.full_slip_number = f"{self.slip_number}-{self.slip_year}"
-        super().save(*args, **kwargs)
+        self.total_quantity = self.get_total_quantity()
+        self.item_count = len(self.items or [])
+        update_fields = kwargs.get('update_fields')
+        items_changed = update_fields is None or 'items' in update_fields
+        if update_fields is not None and items_changed:
+            kwargs['update_fields'] = {*update_fields, 'total_quantity', 'item_count'}
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if items_changed:
+                self.sync_slip_items()
+
+    def sync_slip_items(self):
+        """
+        Replaces the slip's SlipItem rows with the current content of items.
+        """
+        self.slip_items.all().delete()
+        SlipItem.objects.bulk_create(
+            SlipItem(
+                slip=self,
+                position=position,
+                description=(item.get('description') or '')[:255],
+                quantity=parse_quantity(item.get('quantity', 0)) or 0,
+                unit=(item.get('unit') or '')[:50],
+                note=item.get('note') or '',
+            )
+            for position, item in enumerate(self.items or [])
+            if isinstance(item, dict)
+        )
 
     def __str__(self):
         return f"Bolla #{self.full_slip_number} del {self.date.strftime('%d/%m/%Y')} a {self.recipient.company_name}"
 
     def get_total_quantity(self):
+        """
+        Sums the item quantities from the items JSON, parsed like the SlipItem
+        rows, so it always equals the sum of their quantities. Use the stored
+        total_quantity field instead when reading slips; this is what keeps it up to date.
+        """
         total = 0.0
-        try:
-            for item in self.items:
-                quantity = item.get('quantity', 0)
-                if isinstance(quantity, str):
-                    quantity = quantity.replace(',', '.')
-                total += float(quantity)
-        except (ValueError, TypeError):
-            pass
+        for item in self.items or []:
+            if isinstance(item, dict):
+                total += parse_quantity(item.get('quantity', 0)) or 0
         return total
 
     def get_items_display(self):
@@ -206,4 +266,175 @@ class Slip(models.Model):
             unit = item.get('unit', 'pz')
             display_list.append(f"{qty} {unit} - {desc}")
         return ", ".join(display_list)
-    
\ No newline at end of file
+    
+def parse_quantity(value):
+    """
+    Parses an item quantity, which the slip form stores as a comma-decimal string.
+    Returns None when it is not a number.
+    """
+    if isinstance(value, str):
+        value = value.replace(',', '.')
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+class SlipItem(models.Model):
+    """
+    Model to store the line items of a slip as rows, mirroring its items JSON,
+    so quantities can be filtered and aggregated in SQL.
+    """
+    slip = models.ForeignKey(Slip, on_delete=models.CASCADE, related_name='slip_items', verbose_name="Bolla")
+    position = models.PositiveIntegerField(default=0, verbose_name="Posizione")
+    description = models.CharField(max_length=255, db_index=True, verbose_name="Descrizione")
+    quantity = models.FloatField(default=0, verbose_name="Quantità")
+    unit = models.CharField(max_length=50, blank=True, db_index=True, verbose_name="Unità")
+    note = models.TextField(blank=True, verbose_name="Nota")
+
+    class Meta:
+        verbose_name = "Articolo"
+        verbose_name_plural = "Articoli"
+        ordering = ['slip', 'position']
+
+    def __str__(self):
+        return f"{self.quantity} {self.unit} - {self.description}"
+
+class MonthlySummary(models.Model):
+    """
+    Model to store precomputed monthly production totals per recipient and
+    lavorazione, kept up to date as slips are saved and deleted.
+    """
+    year = models.PositiveIntegerField(verbose_name="Anno")
+    month = models.PositiveSmallIntegerField(verbose_name="Mese")
+    recipient = models.ForeignKey(Recipient, on_delete=models.CASCADE, related_name='monthly_summaries', verbose_name="Destinatario")
+    # Empty for slips without a lavorazione
+    lavorazione = models.CharField(max_length=50, blank=True, default='', verbose_name="Lavorazione")
+    slip_count = models.PositiveIntegerField(default=0, verbose_name="Numero Bolle")
+    total_quantity = models.FloatField(default=0, verbose_name="Quantità Totale")
+
+    class Meta:
+        verbose_name = "Riepilogo Mensile"
+        verbose_name_plural = "Riepiloghi Mensili"
+        ordering = ['-year', '-month', 'recipient__company_name', 'lavorazione']
+        unique_together = ('year', 'month', 'recipient', 'lavorazione')
+
+    def __str__(self):
+        return f"{self.month:02d}/{self.year} - {self.recipient} - {self.lavorazione or '-'}"
+
+class RecipientTrigram(models.Model):
+    """
+    Model to store the trigrams of each recipient's search key, used for
+    typo-tolerant recipient search.
+    """
+    recipient = models.ForeignKey(Recipient, on_delete=models.CASCADE, related_name='trigrams', verbose_name="Destinatario")
+    trigram = models.CharField(max_length=3, db_index=True, verbose_name="Trigramma")
+
+    class Meta:
+        verbose_name = "Trigramma Destinatario"
+        verbose_name_plural = "Trigrammi Destinatario"
+        unique_together = ('recipient', 'trigram')
+
+    def __str__(self):
+        return self.trigram
+
+class SlipNumberSequence(models.Model):
+    """
+    Model to store the next slip number to hand out for each year.
+    The row is locked while a number is being reserved.
+    """
+    year = models.PositiveIntegerField(unique=True, verbose_name="Anno")
+    next_number = models.PositiveIntegerField(default=1, verbose_name="Prossimo Numero")
+
+    class Meta:
+        verbose_name = "Sequenza Numeri Bolla"
+        verbose_name_plural = "Sequenze Numeri Bolla"
+        ordering = ['-year']
+
+    def __str__(self):
+        return f"{self.year}: {self.next_number}"
+
+class SlipSearchTerm(models.Model):
+    """
+    Model to store the inverted search index of slips: one row per distinct
+    term of a slip, weighted by the fields it was found in.
+    """
+    slip = models.ForeignKey(Slip, on_delete=models.CASCADE, related_name='search_terms', verbose_name="Bolla")
+    term = models.CharField(max_length=64, db_index=True, verbose_name="Termine")
+    weight = models.PositiveSmallIntegerField(default=1, verbose_name="Peso")
+
+    class Meta:
+        verbose_name = "Termine di Ricerca"
+        verbose_name_plural = "Termini di Ricerca"
+        unique_together = ('slip', 'term')
+
+    def __str__(self):
+        return f"{self.term} ({self.weight})"
+
+class ItemSuggestion(models.Model):
+    """
+    Model to store how often each item description has been used, overall
+    (no recipient) and per recipient, to suggest descriptions and units in the
+    slip form. Kept up to date as slips are saved and deleted.
+    """
+    # Empty for the counts over all recipients
+    recipient = models.ForeignKey(Recipient, on_delete=models.CASCADE, blank=True, null=True, related_name='item_suggestions', verbose_name="Destinatario")
+    # The recipient's pk, or 0 for the counts over all recipients. NULLs are distinct
+    # in a unique index, so the overall rows need a real value to be unique per key
+    scope = models.PositiveIntegerField(default=0, editable=False)
+    # Lowercased description with collapsed spaces, matched by prefix as the user types
+    key = models.CharField(max_length=255, db_index=True, verbose_name="Chiave")
+    description = models.CharField(max_length=255, verbose_name="Descrizione")
+    unit = models.CharField(max_length=50, blank=True, verbose_name="Unità")
+    use_count = models.PositiveIntegerField(default=0, verbose_name="Utilizzi")
+
+    class Meta:
+        verbose_name = "Suggerimento Articolo"
+        verbose_name_plural = "Suggerimenti Articolo"
+        unique_together = ('scope', 'key')
+
+    def __str__(self):
+        return f"{self.description} ({self.use_count})"
+
+class PrintJob(models.Model):
+    """
+    Model to store a bulk print of several slips, rendered in the background
+    into a single merged PDF.
+    """
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "In coda"),
+        (STATUS_RUNNING, "In corso"),
+        (STATUS_DONE, "Completato"),
+        (STATUS_FAILED, "Fallito"),
+    ]
+
+    slip_ids = models.JSONField(default=list, verbose_name="Bolle")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True, verbose_name="Stato")
+    total = models.PositiveIntegerField(default=0, verbose_name="Totale")
+    processed = models.PositiveIntegerField(default=0, verbose_name="Elaborate")
+    failed = models.PositiveIntegerField(default=0, verbose_name="Fallite")
+    file_path = models.CharField(max_length=500, blank=True, null=True, verbose_name="File")
+    error = models.TextField(blank=True, null=True, verbose_name="Errore")
+
+    # Set when a runner claims the job; progress updates only apply while it still holds the lease
+    lease = models.CharField(max_length=32, blank=True, null=True, editable=False)
+    heartbeat = models.DateTimeField(blank=True, null=True, verbose_name="Ultimo aggiornamento")
+
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='print_jobs', verbose_name="Creato da")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Creato il")
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name="Completato il")
+
+    class Meta:
+        verbose_name = "Stampa in Background"
+        verbose_name_plural = "Stampe in Background"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Stampa #{self.pk} ({self.total} bolle) - {self.get_status_display()}"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
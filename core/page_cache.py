@@ -0,0 +1,74 @@
+# file: core/page_cache.py
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+
+GENERATION_KEY = "public-page-generation"
+
+
+def get_generation():
+    return cache.get_or_set(GENERATION_KEY, time.time_ns, None)
+
+
+def invalidate_public_pages():
+    """
+    Drops every cached public page at once by moving to a new key generation;
+    entries of the old generation are never read again and simply expire.
+    Generations are timestamps rather than a counter, so one evicted from the
+    cache can never come back as an older generation with stale pages.
+    """
+    cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+def get_page_key(request, query_params=()):
+    """
+    Returns the cache key of a page: its path plus the values of the query
+    parameters the view reads, or None when the query string holds anything
+    else. Keying on the raw query string would let arbitrary parameters fill
+    the cache with copies of the same page.
+    """
+    if set(request.GET) - set(query_params):
+        return None
+    query = urlencode(
+        [(name, value) for name in sorted(query_params) for value in sorted(request.GET.getlist(name))]
+    )
+    url = f"{request.path}?{query}" if query else request.path
+    return f"public-page:{get_generation()}:{hashlib.md5(url.encode()).hexdigest()}"
+
+
+def cache_public_page(view=None, *, query_params=()):
+    """
+    Caches the whole response of a public view for anonymous visitors.
+
+    Logged in users always get a fresh page, since the navbar shows their
+    profile menu. The language switch happens in the browser, so one cached
+    copy serves both languages. Only plain 200 responses that set no cookies
+    are stored. Views that read query parameters list them in query_params;
+    requests with any other parameter are not cached. Saving or deleting any
+    model shown on these pages invalidates them all (see core/signals.py).
+    """
+    if view is None:
+        return lambda view: cache_public_page(view, query_params=query_params)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        timeout = settings.PUBLIC_PAGE_CACHE_TIMEOUT
+        if not timeout or request.method not in ("GET", "HEAD") or request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+
+        key = get_page_key(request, query_params)
+        if key is None:
+            return view(request, *args, **kwargs)
+        response = cache.get(key)
+        if response is not None:
+            return response
+
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming and not response.cookies:
+            cache.set(key, response, timeout)
+        return response
+    return wrapper
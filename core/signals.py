@@ -0,0 +1,50 @@
+# file: core/signals.py
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from product_collections.models import Collection, Item, ItemImage
+from .hero import refresh_hero_candidates
+from .image_warmup import warm_instance
+from .models import AboutImage, HeroImage, Retailer, TerritoryImage
+from .page_cache import invalidate_public_pages
+from .snapshots import build_snapshots, get_affected_paths
+
+# Models whose content appears on the cached public pages
+PUBLIC_PAGE_MODELS = (HeroImage, AboutImage, TerritoryImage, Retailer, Collection, Item, ItemImage)
+# Models with imagekit derivatives
+IMAGE_MODELS = (HeroImage, AboutImage, TerritoryImage, ItemImage)
+
+
+def invalidate_cached_public_pages(sender, **kwargs):
+    # After the commit, or a visitor could cache the old rows under the new generation
+    transaction.on_commit(invalidate_public_pages)
+
+
+def rebuild_affected_snapshots(sender, instance, **kwargs):
+    if settings.STATIC_SNAPSHOTS:
+        paths = get_affected_paths(instance)
+        transaction.on_commit(lambda: build_snapshots(paths))
+
+
+def refresh_cached_heroes(sender, **kwargs):
+    # The derivatives are generated here rather than by the next home page request
+    transaction.on_commit(refresh_hero_candidates)
+
+
+def warm_saved_image(sender, instance, raw=False, **kwargs):
+    if settings.IMAGE_WARMUP_ON_SAVE and not raw and instance.original_image:
+        transaction.on_commit(lambda: warm_instance(instance))
+
+
+for model in PUBLIC_PAGE_MODELS:
+    post_save.connect(invalidate_cached_public_pages, sender=model)
+    post_delete.connect(invalidate_cached_public_pages, sender=model)
+    post_save.connect(rebuild_affected_snapshots, sender=model)
+    post_delete.connect(rebuild_affected_snapshots, sender=model)
+
+post_save.connect(refresh_cached_heroes, sender=HeroImage)
+post_delete.connect(refresh_cached_heroes, sender=HeroImage)
+
+for model in IMAGE_MODELS:
+    post_save.connect(warm_saved_image, sender=model)
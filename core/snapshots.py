@@ -0,0 +1,187 @@
+# file: core/snapshots.py
+import gzip
+import os
+import shutil
+import tempfile
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from product_collections.models import Collection, Item, ItemImage
+from .models import AboutImage, HeroImage, Retailer, TerritoryImage
+
+try:
+    import brotli
+except ImportError:  # Optional; without it only the gzip variants are written
+    brotli = None
+
+# Pages that do not depend on any model, only on their templates
+TEMPLATE_PAGES = ("/robots.txt", "/sitemap.xml", "/humans.txt", "/llms.txt")
+
+
+def get_snapshot_paths():
+    """
+    Returns the URL path of every public page that is snapshotted.
+    """
+    paths = [reverse(name) for name in ("home", "contact", "instagram", "retailers", "collection_list")]
+    paths += TEMPLATE_PAGES
+    paths += [
+        reverse("collection_detail", args=[pk])
+        for pk in Collection.objects.order_by("pk").values_list("pk", flat=True)
+    ]
+    return paths
+
+
+def get_affected_paths(instance):
+    """
+    Returns the paths of the snapshots showing a model instance.
+    """
+    if isinstance(instance, (HeroImage, AboutImage, TerritoryImage)):
+        return [reverse("home")]
+    if isinstance(instance, Retailer):
+        return [reverse("retailers")]
+    if isinstance(instance, Collection):
+        collection_id = instance.pk
+    elif isinstance(instance, Item):
+        collection_id = instance.collection_id
+    elif isinstance(instance, ItemImage):
+        # The item may already be gone when the image is deleted along with it
+        collection_id = Item.objects.filter(pk=instance.item_id).values_list("collection_id", flat=True).first()
+    else:
+        return []
+    paths = [reverse("collection_list")]
+    # Set on save by product_collections/signals.py; a moved item or image also
+    # has to disappear from the collection it left
+    previous_collection_id = getattr(instance, "_previous_collection_id", None)
+    for pk in dict.fromkeys([collection_id, previous_collection_id]):
+        if pk:
+            paths.append(reverse("collection_detail", args=[pk]))
+    return paths
+
+
+def get_snapshot_file(path):
+    # "/" and "/retailers/" become index.html files, so a static server can map URLs to them directly
+    relative = path.lstrip("/")
+    if not relative or relative.endswith("/"):
+        relative += "index.html"
+    return os.path.join(settings.STATIC_SNAPSHOT_DIR, relative)
+
+
+def get_variants(filename):
+    variants = [filename, filename + ".gz"]
+    if brotli is not None:
+        variants.append(filename + ".br")
+    return variants
+
+
+def render_page(path):
+    """
+    Renders a public page as an anonymous visitor would see it. Returns the
+    response, or None when the page does not exist.
+    """
+    request = RequestFactory().get(path)
+    request.user = AnonymousUser()
+    match = resolve(path)
+    try:
+        response = match.func(request, *match.args, **match.kwargs)
+    except Http404:
+        return None
+    if hasattr(response, "render"):
+        response.render()
+    # A page with a CSRF token (the contact form) cannot be shared between
+    # visitors, since the token must match each visitor's own cookie
+    if request.META.get("CSRF_COOKIE_NEEDS_UPDATE"):
+        response.uses_csrf = True
+    return response
+
+
+def write_file(filename, content):
+    directory = os.path.dirname(filename)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, filename)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_snapshot(path, content):
+    """
+    Writes a page and its compressed variants, unless the page is unchanged.
+    Returns whether anything was written.
+    """
+    filename = get_snapshot_file(path)
+    try:
+        with open(filename, "rb") as f:
+            if f.read() == content and all(os.path.exists(v) for v in get_variants(filename)):
+                return False
+    except FileNotFoundError:
+        pass
+
+    # Compressed variants first, so the plain file never looks up to date without them
+    write_file(filename + ".gz", gzip.compress(content, compresslevel=9, mtime=0))
+    if brotli is not None:
+        write_file(filename + ".br", brotli.compress(content, quality=11))
+    write_file(filename, content)
+    return True
+
+
+def remove_snapshot(path):
+    filename = get_snapshot_file(path)
+    removed = False
+    for variant in [filename, filename + ".gz", filename + ".br"]:
+        try:
+            os.remove(variant)
+            removed = True
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def build_snapshots(paths=None):
+    """
+    Renders the given pages, or all of them, to static files under
+    STATIC_SNAPSHOT_DIR and returns how many were written, unchanged, removed
+    (the page no longer exists) or skipped (it cannot be served statically).
+    """
+    full_build = paths is None
+    if full_build:
+        paths = get_snapshot_paths()
+
+    results = Counter()
+    for path in dict.fromkeys(paths):
+        response = render_page(path)
+        if response is None or response.status_code == 404:
+            results["removed" if remove_snapshot(path) else "unchanged"] += 1
+        elif response.status_code != 200 or getattr(response, "uses_csrf", False):
+            remove_snapshot(path)
+            results["skipped"] += 1
+        elif write_snapshot(path, response.content):
+            results["written"] += 1
+        else:
+            results["unchanged"] += 1
+
+    if full_build:
+        results["removed"] += remove_stale_collections()
+    return results
+
+
+def remove_stale_collections():
+    # Snapshots of collections deleted while no incremental rebuild was running
+    collections_dir = os.path.dirname(os.path.dirname(get_snapshot_file(reverse("collection_detail", args=[0]))))
+    if not os.path.isdir(collections_dir):
+        return 0
+    existing = {str(pk) for pk in Collection.objects.values_list("pk", flat=True)}
+    removed = 0
+    for name in os.listdir(collections_dir):
+        if name.isdigit() and name not in existing:
+            shutil.rmtree(os.path.join(collections_dir, name))
+            removed += 1
+    return removed
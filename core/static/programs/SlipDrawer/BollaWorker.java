@@ -0,0 +1,188 @@
+import com.google.gson.JsonArray;
+import com.google.gson.JsonElement;
+import com.google.gson.JsonParser;
+import org.apache.pdfbox.cos.COSName;
+import org.apache.pdfbox.pdmodel.PDDocument;
+import org.apache.pdfbox.pdmodel.PDPage;
+import org.apache.pdfbox.pdmodel.PDResources;
+import org.apache.pdfbox.pdmodel.graphics.PDXObject;
+import org.apache.pdfbox.pdmodel.graphics.image.PDImageXObject;
+
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.File;
+import java.io.InputStream;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.lang.reflect.Method;
+import java.lang.reflect.Modifier;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.security.MessageDigest;
+import java.util.ArrayList;
+import java.util.Base64;
+import java.util.Comparator;
+import java.util.HashMap;
+import java.util.List;
+import java.util.Map;
+import java.util.stream.Stream;
+
+/**
+ * Long-lived BollaDrawer worker.
+ *
+ * Launched once in source-file mode against the BollaDrawer jar:
+ *
+ *     java -cp BollaDrawer-1.0-SNAPSHOT.jar BollaWorker.java <static_files_path>
+ *
+ * It reads one Bolla JSON document per line from stdin and, for each one,
+ * answers on stdout with either "OK <length>\n" followed by the PDF bytes, or
+ * "ERR <message>\n". Anything publicDrawer prints is redirected to stderr so
+ * it never corrupts the protocol stream.
+ *
+ * A line holding a JSON array of Bollas is rendered as a batch into a single
+ * multi-page PDF. Identical images (the logo on every page) are stored once.
+ * While the batch runs the worker writes "PROGRESS <done> <failed>\n" after
+ * each Bolla, then answers as above.
+ */
+public class BollaWorker {
+
+    public static void main(String[] args) throws Exception {
+        String staticPath = args.length > 0 ? args[0] : System.getProperty("user.dir");
+
+        OutputStream out = System.out;
+        System.setOut(new PrintStream(System.err, true, StandardCharsets.UTF_8));
+
+        Class<?> drawerClass = Class.forName("publicDrawer");
+        Method save = drawerClass.getDeclaredMethod("saveBollaFromJson", String.class, String.class, String.class);
+        save.setAccessible(true);
+        Object drawer = null;
+        if (!Modifier.isStatic(save.getModifiers())) {
+            var constructor = drawerClass.getDeclaredConstructor();
+            constructor.setAccessible(true);
+            drawer = constructor.newInstance();
+        }
+
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        String json;
+        while ((json = in.readLine()) != null) {
+            if (json.isBlank()) {
+                continue;
+            }
+            Path tempDir = Files.createTempDirectory("bolla");
+            try {
+                byte[] content;
+                if (json.stripLeading().startsWith("[")) {
+                    content = renderBatch(save, drawer, json, tempDir, staticPath, out);
+                } else {
+                    save.invoke(drawer, json, tempDir.toString(), staticPath);
+                    Path pdf = findPdf(tempDir);
+                    content = pdf == null ? null : Files.readAllBytes(pdf);
+                }
+                if (content == null) {
+                    reply(out, "ERR PDF not generated");
+                } else {
+                    out.write(("OK " + content.length + "\n").getBytes(StandardCharsets.US_ASCII));
+                    out.write(content);
+                    out.flush();
+                }
+            } catch (Exception e) {
+                Throwable cause = e.getCause() != null ? e.getCause() : e;
+                cause.printStackTrace();
+                reply(out, "ERR " + String.valueOf(cause.getMessage()).replace('\n', ' '));
+            } finally {
+                deleteTree(tempDir);
+            }
+        }
+    }
+
+    private static byte[] renderBatch(Method save, Object drawer, String json, Path tempDir,
+                                      String staticPath, OutputStream out) throws Exception {
+        JsonArray bollas = JsonParser.parseString(json).getAsJsonArray();
+        // Source documents must stay open until the merged one is saved, as imported pages share their objects
+        List<PDDocument> sources = new ArrayList<>();
+        Map<String, PDXObject> images = new HashMap<>();
+        int done = 0;
+        int failed = 0;
+
+        try (PDDocument merged = new PDDocument()) {
+            for (JsonElement bolla : bollas) {
+                Path bollaDir = Files.createDirectory(tempDir.resolve(String.valueOf(done)));
+                Path pdf = null;
+                try {
+                    save.invoke(drawer, bolla.toString(), bollaDir.toString(), staticPath);
+                    pdf = findPdf(bollaDir);
+                } catch (Exception e) {
+                    (e.getCause() != null ? e.getCause() : e).printStackTrace();
+                }
+                if (pdf == null) {
+                    failed++;
+                } else {
+                    PDDocument source = PDDocument.load(pdf.toFile());
+                    sources.add(source);
+                    for (PDPage page : source.getPages()) {
+                        shareImages(merged.importPage(page), images);
+                    }
+                }
+                done++;
+                reply(out, "PROGRESS " + done + " " + failed);
+            }
+
+            if (merged.getNumberOfPages() == 0) {
+                return null;
+            }
+            ByteArrayOutputStream buffer = new ByteArrayOutputStream();
+            merged.save(buffer);
+            return buffer.toByteArray();
+        } finally {
+            for (PDDocument source : sources) {
+                source.close();
+            }
+        }
+    }
+
+    private static void shareImages(PDPage page, Map<String, PDXObject> images) throws Exception {
+        PDResources resources = page.getResources();
+        if (resources == null) {
+            return;
+        }
+        MessageDigest digest = MessageDigest.getInstance("SHA-256");
+        for (COSName name : resources.getXObjectNames()) {
+            PDXObject xobject = resources.getXObject(name);
+            if (!(xobject instanceof PDImageXObject)) {
+                continue;
+            }
+            byte[] raw;
+            try (InputStream in = xobject.getCOSObject().createRawInputStream()) {
+                raw = in.readAllBytes();
+            }
+            String key = Base64.getEncoder().encodeToString(digest.digest(raw));
+            PDXObject first = images.putIfAbsent(key, xobject);
+            if (first != null) {
+                resources.put(name, first);
+            }
+        }
+    }
+
+    private static Path findPdf(Path dir) throws Exception {
+        try (Stream<Path> files = Files.walk(dir)) {
+            return files
+                    .filter(p -> p.getFileName().toString().toLowerCase().endsWith(".pdf"))
+                    .findFirst()
+                    .orElse(null);
+        }
+    }
+
+    private static void reply(OutputStream out, String line) throws Exception {
+        out.write((line + "\n").getBytes(StandardCharsets.UTF_8));
+        out.flush();
+    }
+
+    private static void deleteTree(Path dir) {
+        try (Stream<Path> files = Files.walk(dir)) {
+            files.sorted(Comparator.reverseOrder()).map(Path::toFile).forEach(File::delete);
+        } catch (Exception ignored) {
+        }
+    }
+}
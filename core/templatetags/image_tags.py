@@ -0,0 +1,16 @@
+from django import template
+
+from core.image_resize import get_srcset
+
+register = template.Library()
+
+
+@register.simple_tag
+def resized_srcset(image, kind, image_format="webp"):
+    """
+    Returns a srcset listing the image at every width of the resize endpoint, e.g.
+    {% resized_srcset image "territory" "avif" %}.
+    """
+    if not image or not image.original_image:
+        return ""
+    return get_srcset(image, kind, image_format)
@@ -1,3 +1,273 @@
-from django.test import TestCase
+import datetime
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.admin import helpers
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from user_profile.render_limits import RenderGate
+from .hero import build_hero_candidates, get_hero_candidates
+from .image_resize import ResizedImageCache, get_version, resize_image
+from .page_cache import get_page_key
+from .models import HeroImage, Recipient, Retailer, Slip
+
+
+class RecipientMergeActionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(self.user)
+        self.target = Recipient.objects.create(
+            company_name='Maglificio Rossi', address_line1='Via Roma 1', city='Carpi', postal_code='41012'
+        )
+        self.duplicate = Recipient.objects.create(
+            company_name='Maglificio Rossi S.r.l.', address_line1='Via Roma 1', city='Carpi', postal_code='41012'
+        )
+        self.unrelated = Recipient.objects.create(
+            company_name='Tessitura Bianchi', address_line1='Via Po 3', city='Prato', postal_code='59100'
+        )
+        for number, recipient in enumerate([self.target, self.target, self.duplicate], start=1):
+            Slip.objects.create(
+                slip_number=number, slip_year=2024, date=datetime.date(2024, 3, number),
+                recipient=recipient, created_by=self.user, items=[],
+            )
+        self.url = reverse('admin:core_recipient_changelist')
+
+    def post_action(self, recipients, **extra):
+        return self.client.post(self.url, {
+            'action': 'merge_selected',
+            helpers.ACTION_CHECKBOX_NAME: [recipient.pk for recipient in recipients],
+            **extra,
+        })
+
+    def test_action_asks_for_confirmation_first(self):
+        response = self.post_action([self.target, self.duplicate])
+
+        self.assertTemplateUsed(response, 'admin/core/recipient/merge_selected_confirmation.html')
+        self.assertEqual(response.context['target'], self.target)
+        self.assertEqual(response.context['duplicates'], [(self.duplicate, True)])
+        self.assertEqual(response.context['moved_count'], 1)
+        self.assertEqual(Recipient.objects.count(), 3)
+
+    def test_confirmation_flags_recipients_that_are_not_duplicates(self):
+        response = self.post_action([self.target, self.unrelated])
+
+        self.assertFalse(response.context['all_duplicates'])
+        self.assertContains(response, 'non riconosciuto come duplicato')
+        self.assertTrue(Recipient.objects.filter(pk=self.unrelated.pk).exists())
+
+    def test_confirmed_post_merges(self):
+        response = self.post_action([self.target, self.duplicate], post='yes')
+
+        self.assertRedirects(response, self.url, fetch_redirect_response=False)
+        self.assertFalse(Recipient.objects.filter(pk=self.duplicate.pk).exists())
+        self.assertEqual(self.target.slips.count(), 3)
+
+
+class ResizedImageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(MEDIA_ROOT=cls.media_root, IMAGE_RESIZE_WIDTHS=[320, 640, 1920])
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.cache = ResizedImageCache(tempfile.mkdtemp(dir=self.media_root), 10 * 1024 * 1024)
+        patcher = mock.patch('core.views.get_resized_image_cache', return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        original = io.BytesIO()
+        Image.new('RGB', (1600, 900), 'navy').save(original, 'PNG')
+        self.hero = HeroImage.objects.create(
+            original_image=SimpleUploadedFile('hero.png', original.getvalue(), content_type='image/png')
+        )
+        self.version = get_version(self.hero.original_image)
+
+    def url(self, width=640, image_format='webp', kind='hero', pk=None, version=None):
+        return reverse('resized_image', args=[kind, pk or self.hero.pk, version or self.version, width, image_format])
+
+    def open_response(self, response):
+        return Image.open(io.BytesIO(b''.join(response.streaming_content)))
+
+    def test_serves_resized_image(self):
+        response = self.client.get(self.url(640, 'jpg'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(self.open_response(response).size, (640, 360))
+
+    def test_never_enlarges(self):
+        response = self.client.get(self.url(1920))
+        self.assertEqual(self.open_response(response).size, (1600, 900))
+
+    def test_only_whitelisted_requests_are_served(self):
+        for url in (
+            self.url(kind='retailer'),
+            self.url(image_format='gif'),
+            self.url(width=500),
+            self.url(version='0123456789ab'),
+            self.url(pk=self.hero.pk + 1),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(os.listdir(self.cache.directory), [])
+
+    def test_generated_once_then_read_from_disk(self):
+        with mock.patch('core.views.resize_image', wraps=resize_image) as resize:
+            first = b''.join(self.client.get(self.url()).streaming_content)
+            second = b''.join(self.client.get(self.url()).streaming_content)
+        self.assertEqual(resize.call_count, 1)
+        self.assertEqual(first, second)
+
+    def test_evicted_image_is_generated_again(self):
+        with mock.patch('core.views.resize_image', wraps=resize_image) as resize:
+            self.client.get(self.url()).close()
+            shutil.rmtree(self.cache.directory)
+            response = self.client.get(self.url())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.open_response(response).size, (640, 360))
+        self.assertEqual(resize.call_count, 2)
+
+    def test_image_removed_while_served_stays_readable(self):
+        file = self.cache.open_or_generate('hero/1/v/320.webp', lambda: b'x' * 100)
+        self.cache.max_bytes = 0
+        self.cache.evict()
+
+        self.assertFalse(os.path.exists(file.name))
+        with file:
+            self.assertEqual(file.read(), b'x' * 100)
+
+    def test_generation_goes_through_the_resize_gate(self):
+        gate = RenderGate(1)
+        with mock.patch('core.views.get_resize_gate', return_value=gate):
+            self.client.get(self.url()).close()
+            self.client.get(self.url()).close()
+        # The second request was a cache hit and needed no slot
+        self.assertEqual(gate.admitted, 1)
+
+    def test_evicts_least_recently_used(self):
+        cache = ResizedImageCache(tempfile.mkdtemp(dir=self.media_root), 250)
+        paths = []
+        for width in (320, 640):
+            with cache.open_or_generate(f'hero/1/v/{width}.webp', lambda: b'x' * 100) as file:
+                paths.append(file.name)
+        for age, path in enumerate(reversed(paths)):
+            os.utime(path, (1000 - age, 1000 - age))
+        # A hit makes the oldest entry the most recently used one
+        cache.open_or_generate('hero/1/v/320.webp', lambda: self.fail('cached image generated again')).close()
+
+        cache.open_or_generate('hero/1/v/1920.webp', lambda: b'x' * 100).close()
+
+        self.assertTrue(os.path.exists(paths[0]))
+        self.assertFalse(os.path.exists(paths[1]))
+
+
+@override_settings(PUBLIC_PAGE_CACHE_TIMEOUT=60)
+class PublicPageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.retailer = Retailer.objects.create(name='Boutique Aurora', city='Bologna', region='Emilia-Romagna')
+        self.url = reverse('retailers')
+
+    def test_anonymous_pages_are_served_from_the_cache(self):
+        self.assertContains(self.client.get(self.url), 'Boutique Aurora')
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get(self.url), 'Boutique Aurora')
+
+    def test_logged_in_users_get_a_fresh_page(self):
+        self.client.get(self.url)
+        Retailer.objects.filter(pk=self.retailer.pk).update(name='Boutique Borea')
+        self.client.force_login(User.objects.create_user('ufficio', password='pw'))
+        self.assertContains(self.client.get(self.url), 'Boutique Borea')
+
+    def test_pages_are_invalidated_once_the_change_is_committed(self):
+        self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.retailer.name = 'Boutique Borea'
+            self.retailer.save()
+            # Until the commit the other visitors still get the old page
+            self.assertContains(self.client.get(self.url), 'Boutique Aurora')
+        for callback in callbacks:
+            callback()
+
+        self.assertContains(self.client.get(self.url), 'Boutique Borea')
+
+    def test_unknown_query_parameters_bypass_the_cache(self):
+        self.client.get(self.url)
+        Retailer.objects.filter(pk=self.retailer.pk).update(name='Boutique Borea')
+
+        self.assertContains(self.client.get(self.url, {'utm_source': 'newsletter'}), 'Boutique Borea')
+        self.assertContains(self.client.get(self.url), 'Boutique Aurora')
+
+    def test_key_only_depends_on_the_allowed_parameters(self):
+        factory = RequestFactory()
+        key = get_page_key(factory.get('/collections/', {'page': '2', 'year': '2024'}), ('page', 'year'))
+
+        self.assertEqual(get_page_key(factory.get('/collections/?year=2024&page=2'), ('page', 'year')), key)
+        self.assertNotEqual(get_page_key(factory.get('/collections/', {'page': '3'}), ('page', 'year')), key)
+        self.assertIsNone(get_page_key(factory.get('/collections/', {'page': '2', 'x': '1'}), ('page', 'year')))
+
+
+class HeroCandidateTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        original = io.BytesIO()
+        Image.new('RGB', (2400, 1200), 'navy').save(original, 'PNG')
+        self.hero = HeroImage.objects.create(
+            original_image=SimpleUploadedFile('hero.png', original.getvalue(), content_type='image/png')
+        )
+
+    def spec_exists(self):
+        # .path would generate the file itself
+        file = self.hero.hero_desktop
+        return file.storage.exists(file.name)
+
+    def test_request_never_generates_derivatives(self):
+        with mock.patch('core.hero.refresh_hero_candidates') as refresh:
+            self.assertEqual(get_hero_candidates(), [])
+
+        refresh.assert_called_once_with()
+        self.assertFalse(self.spec_exists())
+
+    def test_generated_derivatives_are_listed(self):
+        [candidate] = build_hero_candidates(generate=True)
+
+        self.assertTrue(self.spec_exists())
+        self.assertEqual(candidate['id'], self.hero.pk)
+        self.assertTrue(candidate['desktop_avif'].endswith('.avif'))
+        with mock.patch('core.hero.refresh_hero_candidates') as refresh:
+            self.assertEqual(get_hero_candidates(), [candidate])
+        refresh.assert_not_called()
@@ -8,4 +8,5 @@ urlpatterns = [
     path("login/", views.login_view, name="login"),
     path("logout/", views.logout_view, name="logout"),
     path("retailers/", views.retailers, name="retailers"),
+    path("images/<slug:kind>/<int:pk>/<slug:version>/<int:width>.<slug:image_format>", views.resized_image, name="resized_image"),
 ]
@@ -1,12 +1,24 @@
-from django.shortcuts import render, redirect
-from .models import TerritoryImage, AboutImage ,HeroImage, Retailer
+from django.shortcuts import render, redirect, get_object_or_404
+from django.http import FileResponse, Http404
+from .models import TerritoryImage, AboutImage, Retailer
 import random
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib import messages
 from django.core.mail import send_mail
 from django.conf import settings
+from .hero import get_hero_candidates, pick_hero
+from .image_resize import (
+    RESIZE_FORMATS,
+    RESIZE_KINDS,
+    get_resize_gate,
+    get_resized_image_cache,
+    get_version,
+    resize_image,
+)
+from .page_cache import cache_public_page
 
+@cache_public_page
 def home(request):
     """
     Renders the home page with dynamic content and optimized images.
@@ -14,7 +26,9 @@ def home(request):
     # Query all TerritoryImage objects from the database
     territory_images = TerritoryImage.objects.all()
     about_images = AboutImage.objects.all()
-    hero_image = HeroImage.objects.order_by('?').first()
+    # The page itself may be cached, so the browser picks the hero it shows
+    # among all candidates; hero_image is the fallback without JavaScript
+    hero_candidates = get_hero_candidates()
 
     context = {
         # ... your existing context
@@ -59,7 +73,8 @@ def home(request):
         # Use the new query instead of the hardcoded list
         "territory_images": territory_images,
         "about_images": about_images,
-        "hero_image": hero_image,
+        "hero_image": pick_hero(hero_candidates),
+        "hero_candidates": hero_candidates,
     }
     return render(request, "tendresse/home.html", context)
 
@@ -141,6 +156,7 @@ def logout_view(request):
     logout(request)
     return redirect('home')
 
+@cache_public_page
 def retailers(request):
     """
     Renders the retailers page.
@@ -156,4 +172,27 @@ def retailers(request):
     context = {
         'retailers_by_region': retailers_by_region,
     }
-    return render(request, 'tendresse/retailers.html', context)
\ No newline at end of file
+    return render(request, 'tendresse/retailers.html', context)
+
+def resized_image(request, kind, pk, version, width, image_format):
+    """
+    Serves an image resized to one of the IMAGE_RESIZE_WIDTHS, generated on first
+    request and then read from the disk cache. The URL changes with the original
+    (version), so browsers and proxies may cache the response forever.
+    """
+    if kind not in RESIZE_KINDS or image_format not in RESIZE_FORMATS or width not in settings.IMAGE_RESIZE_WIDTHS:
+        raise Http404
+    model, ratio = RESIZE_KINDS[kind]
+    image = get_object_or_404(model.objects.only('pk', 'original_image'), pk=pk)
+    if not image.original_image or get_version(image.original_image) != version:
+        raise Http404
+
+    def generate():
+        with get_resize_gate().slot(), image.original_image.open('rb') as source:
+            return resize_image(source, width, ratio, image_format)
+
+    key = f"{kind}/{pk}/{version}/{width}.{image_format}"
+    file = get_resized_image_cache().open_or_generate(key, generate)
+    response = FileResponse(file, content_type=RESIZE_FORMATS[image_format][1])
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
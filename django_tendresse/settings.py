@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 import dj_database_url
 from dotenv import load_dotenv # Import load_dotenv
 
@@ -140,6 +141,64 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 IMAGEKIT_DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
+# Opt-in: generate an image's derivatives in the background right after it is uploaded,
+# instead of on the first page view. `manage.py warm_images` does the same for all images.
+IMAGE_WARMUP_ON_SAVE = os.environ.get('IMAGE_WARMUP_ON_SAVE', 'False').lower() == 'true'
+# Widths the /images/ resize endpoint accepts; templates list all of them in srcset.
+IMAGE_RESIZE_WIDTHS = [int(width) for width in os.environ.get('IMAGE_RESIZE_WIDTHS', '320,480,640,768,960,1280,1600,1920').split(',')]
+# Resized images are cached on disk; upper bound in bytes before LRU eviction.
+IMAGE_RESIZE_CACHE_DIR = os.path.join(MEDIA_ROOT, 'private', 'resized_images')
+IMAGE_RESIZE_CACHE_MAX_BYTES = int(os.environ.get('IMAGE_RESIZE_CACHE_MAX_BYTES', str(1024 * 1024 * 1024)))
+# Resizes generated at once per process; further requests for uncached images wait in line.
+IMAGE_RESIZE_MAX_CONCURRENCY = int(os.environ.get('IMAGE_RESIZE_MAX_CONCURRENCY', '2'))
+
+# Slip PDF rendering (BollaDrawer)
+# Number of long-lived BollaDrawer JVMs per Django process; 0 falls back to one `java -jar` per PDF.
+SLIP_DRAWER_POOL_SIZE = int(os.environ.get('SLIP_DRAWER_POOL_SIZE', '2'))
+# Seconds a pooled worker may spend on one PDF before it is killed and restarted.
+SLIP_DRAWER_TIMEOUT = int(os.environ.get('SLIP_DRAWER_TIMEOUT', '30'))
+# Seconds without starting pooled workers after one failed to start (e.g. no JDK for the worker source).
+SLIP_DRAWER_RESTART_COOLDOWN = int(os.environ.get('SLIP_DRAWER_RESTART_COOLDOWN', '60'))
+# Rendered slip PDFs are cached on disk, keyed by their BollaDrawer payload.
+# Files under MEDIA_ROOT/private/ are never served by the /media/ route.
+SLIP_PDF_CACHE_DIR = os.path.join(MEDIA_ROOT, 'private', 'slip_pdfs')
+# Upper bound of the cache in bytes before LRU eviction; 0 disables the cache.
+SLIP_PDF_CACHE_MAX_BYTES = int(os.environ.get('SLIP_PDF_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+# Opt-in: render a slip's PDF into the cache in the background after it is saved,
+# once it has not been edited again for SLIP_PDF_PRERENDER_DELAY seconds.
+SLIP_PDF_PRERENDER = os.environ.get('SLIP_PDF_PRERENDER', 'False').lower() == 'true'
+SLIP_PDF_PRERENDER_DELAY = float(os.environ.get('SLIP_PDF_PRERENDER_DELAY', '5'))
+# Renders allowed at once per Django process; further requests queue.
+SLIP_RENDER_MAX_CONCURRENCY = int(os.environ.get('SLIP_RENDER_MAX_CONCURRENCY', str(max(SLIP_DRAWER_POOL_SIZE, 1))))
+# Renders allowed at once across all processes on the host (flock slot files); 0 disables the host-wide limit.
+SLIP_RENDER_HOST_LIMIT = int(os.environ.get('SLIP_RENDER_HOST_LIMIT', '4'))
+SLIP_RENDER_LOCK_DIR = os.environ.get('SLIP_RENDER_LOCK_DIR', os.path.join(tempfile.gettempdir(), 'tendresse-render-slots'))
+# Custom prints of at least this many slips run as background jobs instead of in the request.
+PRINT_JOB_MIN_SLIPS = int(os.environ.get('PRINT_JOB_MIN_SLIPS', '20'))
+PRINT_JOB_DIR = os.path.join(MEDIA_ROOT, 'private', 'print_jobs')
+# A running job without a heartbeat for this many seconds is considered abandoned and requeued.
+PRINT_JOB_STALE_AFTER = int(os.environ.get('PRINT_JOB_STALE_AFTER', '300'))
+
+# Cache backend, local memory by default. With several server processes use a shared
+# one so an invalidation reaches all of them, e.g. CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+# and CACHE_LOCATION=/var/tmp/tendresse_cache.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'tendresse'),
+    }
+}
+# Seconds the public pages (home, retailers, collections) are cached for anonymous visitors; 0 disables it.
+# Edits to the content they show invalidate them right away, this only bounds how long unused entries live.
+PUBLIC_PAGE_CACHE_TIMEOUT = int(os.environ.get('PUBLIC_PAGE_CACHE_TIMEOUT', '86400'))
+# Static HTML snapshots of the public pages, written by `manage.py build_snapshots` with .gz
+# (and .br, when the brotli package is installed) variants next to each file. With
+# STATIC_SNAPSHOTS on, the snapshots showing a model are rebuilt whenever it is saved or deleted.
+# Serve them from the front proxy to visitors without a session cookie, or through WhiteNoise
+# with WHITENOISE_ROOT = STATIC_SNAPSHOT_DIR and WHITENOISE_INDEX_FILE = True, which however
+# also serves them to logged in users.
+STATIC_SNAPSHOT_DIR = os.environ.get('STATIC_SNAPSHOT_DIR', os.path.join(BASE_DIR, 'snapshots'))
+STATIC_SNAPSHOTS = os.environ.get('STATIC_SNAPSHOTS', 'False').lower() == 'true'
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'mail.tendresse.it'
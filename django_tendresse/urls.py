@@ -38,5 +38,6 @@ urlpatterns = [
 
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 urlpatterns += [
-    re_path(r'^media/(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT,}),
+    # private/ holds generated slip PDFs and must stay behind the login-protected views
+    re_path(r'^media/(?!private/)(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT,}),
 ]
\ No newline at end of file
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from product_collections.models import Collection
+
+
+class Command(BaseCommand):
+    help = 'Sets the stored cover image of every collection from its items.'
+
+    def handle(self, *args, **options):
+        updated = 0
+        for collection in Collection.objects.all():
+            previous = collection.cover_image_id
+            collection.update_cover_image()
+            if collection.cover_image_id != previous:
+                updated += 1
+        self.stdout.write(self.style.SUCCESS(f'Updated the cover image of {updated} collections'))
@@ -7,10 +7,27 @@ class Collection(models.Model):
     season = models.CharField(max_length=50)
     year = models.IntegerField()
     description = models.TextField(blank=True, null=True)
+    # Image shown for the collection in the list, kept up to date by signals (see get_cover_image)
+    cover_image = models.ForeignKey('ItemImage', on_delete=models.SET_NULL, blank=True, null=True, related_name='+', editable=False)
 
     def __str__(self):
         return f"{self.name} ({self.season} {self.year})"
 
+    def get_cover_image(self):
+        """
+        Returns the main image of the collection's first item, or its first image
+        by order. Use the stored cover_image when reading; this is what keeps it up to date.
+        """
+        main_item = self.items.order_by('pk').first()
+        if not main_item:
+            return None
+        return main_item.images.order_by('-is_main', 'order', 'pk').first()
+
+    def update_cover_image(self):
+        # update() rather than save(), so saving an image doesn't count as editing the collection
+        self.cover_image = self.get_cover_image()
+        Collection.objects.filter(pk=self.pk).update(cover_image=self.cover_image)
+
 class Item(models.Model):
     collection = models.ForeignKey(Collection, on_delete=models.CASCADE, related_name='items')
     unique_code = models.CharField(max_length=100, unique=True)
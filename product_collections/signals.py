@@ -0,0 +1,52 @@
+# file: product_collections/signals.py
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Collection, Item, ItemImage
+
+
+def update_collection_cover(collection_id):
+    collection = Collection.objects.filter(pk=collection_id).first()
+    if collection is not None:
+        collection.update_cover_image()
+
+
+@receiver(pre_save, sender=ItemImage)
+def remember_image_collection(sender, instance, raw=False, **kwargs):
+    instance._previous_collection_id = None
+    if instance.pk and not raw:
+        instance._previous_collection_id = (
+            ItemImage.objects.filter(pk=instance.pk).values_list('item__collection_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=ItemImage)
+@receiver(post_delete, sender=ItemImage)
+def update_cover_for_image(sender, instance, **kwargs):
+    # The item is already gone when its images are deleted along with it
+    collection_id = Item.objects.filter(pk=instance.item_id).values_list('collection_id', flat=True).first()
+    if collection_id:
+        update_collection_cover(collection_id)
+
+
+@receiver(pre_save, sender=Item)
+def remember_item_collection(sender, instance, raw=False, **kwargs):
+    instance._previous_collection_id = None
+    if instance.pk and not raw:
+        instance._previous_collection_id = Item.objects.filter(pk=instance.pk).values_list('collection_id', flat=True).first()
+
+
+@receiver(post_save, sender=Item)
+def update_cover_for_item(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous_collection_id = getattr(instance, '_previous_collection_id', None)
+    if created or previous_collection_id != instance.collection_id:
+        update_collection_cover(instance.collection_id)
+        if previous_collection_id:
+            update_collection_cover(previous_collection_id)
+
+
+@receiver(post_delete, sender=Item)
+def update_cover_for_deleted_item(sender, instance, **kwargs):
+    update_collection_cover(instance.collection_id)
@@ -1,3 +1,102 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .models import Collection, Item, ItemImage
+
+# Smallest valid GIF, enough for the image fields
+GIF = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00'
+    b',\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+)
+
+
+class CollectionTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(MEDIA_ROOT=cls.media_root, PUBLIC_PAGE_CACHE_TIMEOUT=0)
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def add_image(self, item, **kwargs):
+        return ItemImage.objects.create(
+            item=item, original_image=SimpleUploadedFile('item.gif', GIF, content_type='image/gif'), **kwargs
+        )
+
+
+class CollectionCoverImageTests(CollectionTestCase):
+    def test_cover_follows_main_image_and_order(self):
+        collection = Collection.objects.create(name='Inverno', season='FW', year=2024)
+        item = Item.objects.create(collection=collection, unique_code='FW-1', name='Cardigan')
+        second = self.add_image(item, order=2)
+        first = self.add_image(item, order=1)
+        collection.refresh_from_db()
+        self.assertEqual(collection.cover_image, first)
+
+        second.is_main = True
+        second.save()
+        collection.refresh_from_db()
+        self.assertEqual(collection.cover_image, second)
+
+        second.delete()
+        collection.refresh_from_db()
+        self.assertEqual(collection.cover_image, first)
+
+    def test_list_query_count_does_not_grow_with_collections(self):
+        for index in range(5):
+            collection = Collection.objects.create(name=f'Collezione {index}', season='SS', year=2020 + index)
+            item = Item.objects.create(collection=collection, unique_code=f'SS-{index}', name='Maglia')
+            self.add_image(item, is_main=True)
+        Collection.objects.create(name='Vuota', season='SS', year=2019)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('collection_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sum(1 for c in response.context['collections'] if c['main_image']), 5)
+
+
+@override_settings(STATIC_SNAPSHOTS=True)
+class SnapshotPathTests(CollectionTestCase):
+    def setUp(self):
+        self.winter = Collection.objects.create(name='Inverno', season='FW', year=2024)
+        self.summer = Collection.objects.create(name='Estate', season='SS', year=2025)
+        self.item = Item.objects.create(collection=self.winter, unique_code='FW-1', name='Cardigan')
+        self.other_item = Item.objects.create(collection=self.summer, unique_code='SS-1', name='Maglia')
+
+    def rebuilt_paths(self, change):
+        with mock.patch('core.signals.build_snapshots') as build, self.captureOnCommitCallbacks(execute=True):
+            change()
+        return {path for call in build.call_args_list for path in call.args[0]}
+
+    def detail(self, collection):
+        return reverse('collection_detail', args=[collection.pk])
+
+    def test_moved_item_rebuilds_both_collections(self):
+        self.item.collection = self.summer
+
+        paths = self.rebuilt_paths(self.item.save)
+
+        self.assertEqual(paths, {reverse('collection_list'), self.detail(self.winter), self.detail(self.summer)})
+
+    def test_image_moved_to_another_collection_rebuilds_both(self):
+        image = self.add_image(self.item)
+        image.item = self.other_item
+
+        paths = self.rebuilt_paths(image.save)
+
+        self.assertEqual(paths, {reverse('collection_list'), self.detail(self.winter), self.detail(self.summer)})
+
+    def test_edit_in_place_rebuilds_one_collection(self):
+        self.item.name = 'Cardigan lungo'
+        self.assertEqual(self.rebuilt_paths(self.item.save), {reverse('collection_list'), self.detail(self.winter)})
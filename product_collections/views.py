@@ -1,28 +1,21 @@
 from django.shortcuts import render, get_object_or_404
-from .models import Collection, Item, ItemImage
+from core.page_cache import cache_public_page
+from .models import Collection, Item
 
 
+@cache_public_page
 def collection_list_view(request):
     """
     Displays a list of all product collections with their main image.
     """
-    collections_with_images = []
-    collections = Collection.objects.all().order_by('-year', 'name')
-
-    for collection in collections:
-        # Try to find an item with a main image for the collection's display
-        main_item = Item.objects.filter(collection=collection).first()
-        if main_item:
-            main_image = ItemImage.objects.filter(item=main_item, is_main=True).first()
-            if not main_image:
-                main_image = ItemImage.objects.filter(item=main_item).order_by('order').first()
-        else:
-            main_image = None
-        
-        collections_with_images.append({
+    collections = Collection.objects.select_related('cover_image').order_by('-year', 'name')
+    collections_with_images = [
+        {
             'collection': collection,
-            'main_image': main_image,
-        })
+            'main_image': collection.cover_image,
+        }
+        for collection in collections
+    ]
 
     context = {
         'page_title': 'Collections',
@@ -31,6 +24,7 @@ def collection_list_view(request):
     return render(request, 'collections/collection_list.html', context)
 
 
+@cache_public_page
 def collection_detail_view(request, pk):
     """
     Displays the details of a single collection and its items.
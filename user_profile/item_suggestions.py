@@ -0,0 +1,164 @@
+# file: user_profile/item_suggestions.py
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from core.models import ItemSuggestion, SlipItem
+
+SUGGESTION_LIMIT = 10
+
+
+def get_item_key(description):
+    return " ".join(str(description or "").lower().split())[:255]
+
+
+def get_scope(recipient_id):
+    return recipient_id or 0
+
+
+def get_item_usage(recipient_id, items):
+    """
+    Counts the descriptions of a slip's items JSON, both overall (recipient None)
+    and for its recipient. Returns the counts keyed by (recipient_id, key) and the
+    description and unit each key was last written with.
+    """
+    counts = Counter()
+    latest = {}
+    for item in items or []:
+        if not isinstance(item, dict):
+            continue
+        key = get_item_key(item.get("description"))
+        if not key:
+            continue
+        counts[(None, key)] += 1
+        counts[(recipient_id, key)] += 1
+        latest[key] = (
+            " ".join(str(item["description"]).split())[:255],
+            (item.get("unit") or "").strip()[:50],
+        )
+    return counts, latest
+
+
+def update_item_suggestions(previous, current):
+    """
+    Applies the change from one version of a slip to the next to the suggestion
+    counts. Both are (recipient_id, items) pairs, or None for a slip that did
+    not exist before or no longer exists. Only the descriptions whose count
+    changed are written, so re-saving a slip with the same items costs nothing.
+    """
+    previous_counts, _ = get_item_usage(*previous) if previous else (Counter(), {})
+    current_counts, latest = get_item_usage(*current) if current else (Counter(), {})
+
+    with transaction.atomic():
+        for recipient_id, key in previous_counts.keys() | current_counts.keys():
+            delta = current_counts[(recipient_id, key)] - previous_counts[(recipient_id, key)]
+            if delta > 0:
+                description, unit = latest[key]
+                add_suggestion_uses(recipient_id, key, delta, description, unit)
+            elif delta < 0:
+                rows = ItemSuggestion.objects.filter(scope=get_scope(recipient_id), key=key)
+                rows.filter(use_count__lte=-delta).delete()
+                rows.update(use_count=F("use_count") + delta)
+
+
+def add_suggestion_uses(recipient_id, key, count, description, unit):
+    # The latest spelling and unit win, a blank unit keeps the one already known
+    changes = {"use_count": F("use_count") + count, "description": description}
+    if unit:
+        changes["unit"] = unit
+    rows = ItemSuggestion.objects.filter(scope=get_scope(recipient_id), key=key)
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            ItemSuggestion.objects.create(
+                recipient_id=recipient_id, scope=get_scope(recipient_id), key=key,
+                description=description, unit=unit, use_count=count,
+            )
+    except IntegrityError:
+        # Created concurrently by another slip save
+        rows.update(**changes)
+
+
+def suggest_items(query, recipient_id=None, limit=SUGGESTION_LIMIT):
+    """
+    Returns the descriptions starting with query, the ones most used for the
+    recipient first, then the ones most used overall. Each suggestion carries
+    the unit to default to: the recipient's usual one, else the overall one.
+    Only the suggestion table is read, through its (scope, key) index.
+    """
+    suggestions = ItemSuggestion.objects.all()
+    key = get_item_key(query)
+    if key:
+        suggestions = suggestions.filter(key__startswith=key)
+
+    overall = Q(scope=0)
+    if recipient_id:
+        for_recipient = Q(scope=recipient_id)
+        suggestions = suggestions.filter(overall | for_recipient).values("key").annotate(
+            recipient_uses=Coalesce(Sum("use_count", filter=for_recipient), 0),
+            recipient_unit=Max("unit", filter=for_recipient),
+        )
+    else:
+        suggestions = suggestions.filter(overall).values("key").annotate(
+            recipient_uses=Value(0),
+            recipient_unit=Value(""),
+        )
+
+    rows = suggestions.annotate(
+        uses=Coalesce(Sum("use_count", filter=overall), 0),
+        suggested_description=Max("description", filter=overall),
+        overall_unit=Max("unit", filter=overall),
+    ).order_by("-recipient_uses", "-uses", "key")[:limit]
+
+    return [
+        {
+            "description": row["suggested_description"],
+            "unit": row["recipient_unit"] or row["overall_unit"] or "",
+            "uses": row["uses"],
+            "recipient_uses": row["recipient_uses"],
+        }
+        for row in rows
+        if row["suggested_description"]
+    ]
+
+
+def rebuild_item_suggestions(recipient_id=None):
+    """
+    Recomputes the suggestion counts from the SlipItem rows, either entirely or
+    only the rows of one recipient. Items are read oldest slip first, so the
+    description and unit of each key end up as last written.
+    """
+    items = SlipItem.objects.order_by("slip__date", "slip_id", "position")
+    if recipient_id is not None:
+        items = items.filter(slip__recipient_id=recipient_id)
+
+    suggestions = {}
+    for slip_recipient_id, description, unit in items.values_list(
+        "slip__recipient_id", "description", "unit"
+    ).iterator():
+        key = get_item_key(description)
+        if not key:
+            continue
+        unit = (unit or "").strip()
+        recipients = (slip_recipient_id,) if recipient_id is not None else (None, slip_recipient_id)
+        for rid in recipients:
+            suggestion = suggestions.get((rid, key))
+            if suggestion is None:
+                suggestion = suggestions[(rid, key)] = ItemSuggestion(
+                    recipient_id=rid, scope=get_scope(rid), key=key, use_count=0
+                )
+            suggestion.use_count += 1
+            suggestion.description = " ".join(description.split())
+            if unit:
+                suggestion.unit = unit
+
+    with transaction.atomic():
+        if recipient_id is None:
+            ItemSuggestion.objects.all().delete()
+        else:
+            ItemSuggestion.objects.filter(recipient_id=recipient_id).delete()
+        ItemSuggestion.objects.bulk_create(suggestions.values(), batch_size=1000)
+    return len(suggestions)
@@ -0,0 +1,23 @@
+import os
+import subprocess
+
+from django.core.management.base import BaseCommand, CommandError
+
+from user_profile.slip_pdf import get_drawer_dir, get_jar_path, get_worker_class_path
+
+
+class Command(BaseCommand):
+    help = 'Compiles BollaWorker.java next to the BollaDrawer jar, so the pooled workers run on a plain JRE.'
+
+    def handle(self, *args, **options):
+        command = [
+            'javac', '-cp', get_jar_path(), '-d', get_drawer_dir(),
+            os.path.join(get_drawer_dir(), 'BollaWorker.java'),
+        ]
+        try:
+            subprocess.run(command, check=True)
+        except OSError as e:
+            raise CommandError(f'Cannot run javac, a JDK is needed to build the worker: {e}')
+        except subprocess.CalledProcessError as e:
+            raise CommandError(f'javac failed with exit code {e.returncode}')
+        self.stdout.write(self.style.SUCCESS(f'Built {get_worker_class_path()}'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Recipient
+from user_profile.recipient_duplicates import find_duplicate_groups, merge_recipients, pick_merge_target
+
+
+class Command(BaseCommand):
+    help = 'Lists groups of probably duplicate recipients; with --merge, merges each group into its most used recipient.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--merge', action='store_true', help='Merge every group found')
+        parser.add_argument('--no-input', action='store_true', help='Do not ask for confirmation before each merge')
+
+    def handle(self, *args, **options):
+        groups = find_duplicate_groups()
+        merged = 0
+        for group in groups:
+            target = pick_merge_target(group)
+            duplicates = list(Recipient.objects.filter(pk__in=group).exclude(pk=target.pk))
+            self.stdout.write(f'{target.pk}: {target}')
+            for recipient in duplicates:
+                self.stdout.write(f'    {recipient.pk}: {recipient} (P.IVA {recipient.vat_number or "-"})')
+
+            if not options['merge']:
+                continue
+            if not options['no_input'] and input(f'Merge into {target.pk}? [y/N] ').lower() != 'y':
+                continue
+            moved = merge_recipients(target, duplicates)
+            merged += 1
+            self.stdout.write(self.style.SUCCESS(f'Merged {len(duplicates)} recipients into {target.pk}, {moved} slips moved'))
+
+        self.stdout.write(self.style.SUCCESS(f'Found {len(groups)} groups of duplicates, merged {merged}'))
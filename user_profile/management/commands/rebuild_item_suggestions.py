@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from user_profile.item_suggestions import rebuild_item_suggestions
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the item description suggestions from the items of all slips.'
+
+    def handle(self, *args, **options):
+        count = rebuild_item_suggestions()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} item suggestion rows'))
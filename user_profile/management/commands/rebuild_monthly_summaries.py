@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from user_profile.summaries import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the monthly production summaries from all slips.'
+
+    def handle(self, *args, **options):
+        count = rebuild_summaries()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} monthly summary rows'))
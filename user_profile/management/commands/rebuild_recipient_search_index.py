@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Recipient
+from user_profile.recipient_search import get_search_key, index_recipient
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the search key and trigrams of every recipient.'
+
+    def handle(self, *args, **options):
+        count = 0
+        for recipient in Recipient.objects.iterator(chunk_size=500):
+            recipient.search_key = get_search_key(recipient)
+            Recipient.objects.filter(pk=recipient.pk).update(search_key=recipient.search_key)
+            index_recipient(recipient)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} recipients'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Slip
+from user_profile.slip_search import index_slip
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the search index of every slip.'
+
+    def handle(self, *args, **options):
+        count = 0
+        for slip in Slip.objects.select_related('recipient').prefetch_related('slip_items').iterator(chunk_size=500):
+            index_slip(slip)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} slips'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+import time
+
+from user_profile.print_jobs import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = 'Processes queued bulk print jobs; with --loop it keeps polling for new ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running and poll for new jobs')
+        parser.add_argument('--interval', type=int, default=5, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            run_pending_jobs()
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('No print jobs left in the queue'))
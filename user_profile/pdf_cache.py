@@ -0,0 +1,235 @@
+# file: user_profile/pdf_cache.py
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from core.models import Slip
+
+
+class SlipPdfCache:
+    """
+    Content-addressed on-disk cache of rendered slip PDFs.
+
+    Entries are keyed by a hash of the exact BollaDrawer payload, so any change
+    to a slip or its recipient produces a new key. A small pointer file per slip
+    remembers its current key, which lets signals drop the entry explicitly.
+    The least recently used entries are evicted once the cache grows past
+    max_bytes. The total size is tracked in memory, so the directory is only
+    walked to evict, and every rescan_interval seconds to pick up what other
+    processes wrote.
+    """
+
+    def __init__(self, directory, max_bytes, rescan_interval=300):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.rescan_interval = rescan_interval
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = None
+        self._scanned_at = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key_for(bolla_data):
+        payload = json.dumps(bolla_data, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.pdf")
+
+    def pointer_for(self, slip_pk):
+        return os.path.join(self.directory, "slips", str(slip_pk))
+
+    def get(self, key):
+        path = self.path_for(key)
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+            # Touch the entry so eviction sees it as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return content
+
+    def put(self, key, content, slip_pk=None):
+        path = self.path_for(key)
+        replaced = self._file_size(path)
+        self._write_atomic(path, content)
+        self._add_size(len(content) - replaced)
+
+        if slip_pk is not None:
+            pointer = self.pointer_for(slip_pk)
+            old_key = self._read_pointer(pointer)
+            if old_key and old_key != key:
+                self._remove_entry(self.path_for(old_key))
+            self._write_atomic(pointer, key.encode("ascii"))
+
+        with self._lock:
+            stale = time.monotonic() - self._scanned_at > self.rescan_interval
+            over = self._size is None or self._size > self.max_bytes
+        if stale or over:
+            self.evict()
+
+    def invalidate_slip(self, slip_pk):
+        pointer = self.pointer_for(slip_pk)
+        key = self._read_pointer(pointer)
+        if key:
+            self._remove_entry(self.path_for(key))
+        self._remove(pointer)
+
+    def evict(self):
+        """
+        Removes the least recently used PDFs until the cache fits in max_bytes,
+        and resets the tracked size to what is actually on disk.
+        """
+        entries = []
+        total = 0
+        for root, dirs, files in os.walk(self.directory):
+            for fname in files:
+                if not fname.endswith(".pdf"):
+                    continue
+                path = os.path.join(root, fname)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        if total > self.max_bytes:
+            entries.sort()
+            for mtime, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+                with self._lock:
+                    self.evictions += 1
+
+        with self._lock:
+            self._size = total
+            self._scanned_at = time.monotonic()
+
+    def clear(self):
+        for root, dirs, files in os.walk(self.directory):
+            for fname in files:
+                self._remove(os.path.join(root, fname))
+        with self._lock:
+            self._size = 0
+
+    def stats(self):
+        entries = 0
+        size = 0
+        for root, dirs, files in os.walk(self.directory):
+            for fname in files:
+                if fname.endswith(".pdf"):
+                    entries += 1
+                    try:
+                        size += os.path.getsize(os.path.join(root, fname))
+                    except FileNotFoundError:
+                        pass
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "size_bytes": size,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _write_atomic(self, path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(temp_path, path)
+        except Exception:
+            self._remove(temp_path)
+            raise
+
+    def _add_size(self, delta):
+        with self._lock:
+            if self._size is not None:
+                self._size += delta
+
+    def _remove_entry(self, path):
+        size = self._file_size(path)
+        if size:
+            self._remove(path)
+            self._add_size(-size)
+
+    @staticmethod
+    def _file_size(path):
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def _read_pointer(pointer):
+        try:
+            with open(pointer, "r", encoding="ascii") as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_pdf_cache():
+    """
+    Returns the process-wide slip PDF cache.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SlipPdfCache(
+                settings.SLIP_PDF_CACHE_DIR, settings.SLIP_PDF_CACHE_MAX_BYTES
+            )
+        return _cache
+
+
+def invalidate_recipient_pdfs_in_background(recipient_pk):
+    """
+    Drops the cached PDFs of a recipient's slips in a background thread.
+    """
+    def run():
+        try:
+            cache = get_pdf_cache()
+            slip_pks = Slip.objects.filter(recipient_id=recipient_pk).values_list("pk", flat=True)
+            for slip_pk in slip_pks.iterator():
+                cache.invalidate_slip(slip_pk)
+        except Exception as e:
+            print(f"Error invalidating cached PDFs of recipient {recipient_pk}: {e}")
+        finally:
+            connection.close()
+
+    threading.Thread(target=run, daemon=True).start()
@@ -0,0 +1,130 @@
+# file: user_profile/pdf_stream.py
+from collections import deque
+from io import BytesIO
+
+from PyPDF2 import PdfReader
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject
+
+
+class StreamingPdfWriter:
+    """
+    Concatenates the pages of several PDFs into one document, chunk by chunk.
+
+    Unlike PdfMerger, which keeps every input and the merged output in memory
+    until write(), each input document is parsed, renumbered and serialized on
+    its own, so only the byte offsets of the objects written so far are kept.
+    The page tree, catalog and cross-reference table are emitted by finish().
+    """
+
+    CATALOG = 1
+    PAGES = 2
+
+    def __init__(self):
+        self.offset = 0
+        # offsets[n] is the byte offset of object n; object 0 is the free-list head
+        self.offsets = [0, None, None]
+        self.kids = []
+
+    def start(self):
+        return self._emit(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+    def add_document(self, pdf_content):
+        """
+        Returns the serialized objects for every page of pdf_content.
+        Nothing is recorded if the document cannot be parsed.
+        """
+        saved = (len(self.offsets), len(self.kids))
+        try:
+            return self._add_document(pdf_content)
+        except Exception:
+            del self.offsets[saved[0]:]
+            del self.kids[saved[1]:]
+            raise
+
+    def finish(self):
+        buffer = BytesIO()
+        kids = " ".join(f"{number} 0 R" for number in self.kids)
+        self._write_raw(
+            buffer,
+            self.PAGES,
+            f"<< /Type /Pages /Kids [{kids}] /Count {len(self.kids)} >>".encode("ascii"),
+        )
+        self._write_raw(
+            buffer,
+            self.CATALOG,
+            f"<< /Type /Catalog /Pages {self.PAGES} 0 R >>".encode("ascii"),
+        )
+
+        xref_offset = self.offset + buffer.tell()
+        buffer.write(f"xref\n0 {len(self.offsets)}\n".encode("ascii"))
+        buffer.write(b"0000000000 65535 f \n")
+        for offset in self.offsets[1:]:
+            buffer.write(f"{offset:010d} 00000 n \n".encode("ascii"))
+        buffer.write(
+            f"trailer\n<< /Size {len(self.offsets)} /Root {self.CATALOG} 0 R >>\n"
+            f"startxref\n{xref_offset}\n%%EOF\n".encode("ascii")
+        )
+        return self._emit(buffer.getvalue())
+
+    def _add_document(self, pdf_content):
+        reader = PdfReader(BytesIO(pdf_content), strict=False)
+        mapping = {}
+        pending = deque()
+        parent = IndirectObject(self.PAGES, 0, None)
+        page_numbers = set()
+
+        for page in reader.pages:
+            number = self._allocate()
+            ref = page.indirect_reference
+            if ref is not None:
+                mapping[(ref.idnum, ref.generation)] = number
+            # Inheritable attributes were already copied onto the page by PdfReader,
+            # so the original page tree is dropped and never followed
+            if "/Parent" in page:
+                del page["/Parent"]
+            pending.append((number, page))
+            page_numbers.add(number)
+            self.kids.append(number)
+
+        buffer = BytesIO()
+        while pending:
+            number, obj = pending.popleft()
+            self._remap(obj, mapping, pending)
+            if number in page_numbers:
+                obj[NameObject("/Parent")] = parent
+            self.offsets[number] = self.offset + buffer.tell()
+            buffer.write(f"{number} 0 obj\n".encode("ascii"))
+            obj.write_to_stream(buffer, None)
+            buffer.write(b"\nendobj\n")
+        return self._emit(buffer.getvalue())
+
+    def _remap(self, obj, mapping, pending):
+        """
+        Rewrites the indirect references in obj to their numbers in the output,
+        queueing every object not seen before.
+        """
+        if isinstance(obj, IndirectObject):
+            key = (obj.idnum, obj.generation)
+            if key not in mapping:
+                mapping[key] = self._allocate()
+                pending.append((mapping[key], obj.get_object()))
+            return IndirectObject(mapping[key], 0, None)
+        if isinstance(obj, DictionaryObject):
+            for key, value in list(obj.items()):
+                obj[key] = self._remap(value, mapping, pending)
+        elif isinstance(obj, ArrayObject):
+            for index, value in enumerate(obj):
+                obj[index] = self._remap(value, mapping, pending)
+        return obj
+
+    def _allocate(self):
+        self.offsets.append(None)
+        return len(self.offsets) - 1
+
+    def _write_raw(self, buffer, number, body):
+        self.offsets[number] = self.offset + buffer.tell()
+        buffer.write(f"{number} 0 obj\n".encode("ascii") + body + b"\nendobj\n")
+
+    def _emit(self, chunk):
+        self.offset += len(chunk)
+        return chunk
@@ -0,0 +1,46 @@
+# file: user_profile/prerender.py
+import threading
+
+from django.conf import settings
+from django.db import connection
+
+from core.models import Slip
+from .slip_pdf import generate_slip_pdf
+
+_timers = {}
+_timers_lock = threading.Lock()
+
+
+def schedule_prerender(slip_pk):
+    """
+    Renders the slip's PDF into the cache in the background, once the slip has
+    not been saved again for SLIP_PDF_PRERENDER_DELAY seconds. Each save restarts
+    the countdown, so a burst of edits results in a single render.
+    """
+    with _timers_lock:
+        timer = _timers.pop(slip_pk, None)
+        if timer is not None:
+            timer.cancel()
+        timer = threading.Timer(settings.SLIP_PDF_PRERENDER_DELAY, prerender_slip, args=[slip_pk])
+        timer.daemon = True
+        _timers[slip_pk] = timer
+        timer.start()
+
+
+def cancel_prerender(slip_pk):
+    with _timers_lock:
+        timer = _timers.pop(slip_pk, None)
+    if timer is not None:
+        timer.cancel()
+
+
+def prerender_slip(slip_pk):
+    with _timers_lock:
+        if _timers.get(slip_pk) is threading.current_thread():
+            del _timers[slip_pk]
+    try:
+        slip = Slip.objects.select_related("recipient").filter(pk=slip_pk).first()
+        if slip is not None:
+            generate_slip_pdf(slip)
+    finally:
+        connection.close()
@@ -0,0 +1,171 @@
+# file: user_profile/print_jobs.py
+import os
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from core.models import PrintJob, Slip
+from .pdf_stream import StreamingPdfWriter
+from .slip_pdf import SlipRenderError, iter_slip_documents
+
+
+class LeaseLost(Exception):
+    """
+    Raised when another runner has taken over a job this runner was processing.
+    """
+
+
+def submit_print_job(user, slip_ids):
+    """
+    Persists a bulk print job and makes sure a runner will pick it up.
+    """
+    job = PrintJob.objects.create(
+        slip_ids=list(slip_ids),
+        total=len(slip_ids),
+        created_by=user,
+    )
+    ensure_runner()
+    return job
+
+
+def get_job_path(job):
+    return os.path.join(settings.PRINT_JOB_DIR, f"{job.pk}.pdf")
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def ensure_runner():
+    """
+    Starts the in-process runner thread if it is not already running.
+
+    There is no broker: jobs live in the database and any web process can run
+    them. A job whose runner died with its process is picked up again once its
+    heartbeat is older than PRINT_JOB_STALE_AFTER.
+    """
+    global _runner
+    with _runner_lock:
+        if _runner is None or not _runner.is_alive():
+            _runner = threading.Thread(target=run_pending_jobs, name="print-jobs", daemon=True)
+            _runner.start()
+
+
+def run_pending_jobs():
+    """
+    Processes pending jobs one at a time until there are none left.
+    """
+    try:
+        while True:
+            recover_stale_jobs()
+            job = claim_next_job()
+            if job is None:
+                return
+            process_job(job)
+    finally:
+        connection.close()
+
+
+def recover_stale_jobs():
+    stale_before = timezone.now() - timedelta(seconds=settings.PRINT_JOB_STALE_AFTER)
+    return PrintJob.objects.filter(
+        status=PrintJob.STATUS_RUNNING, heartbeat__lt=stale_before
+    ).update(status=PrintJob.STATUS_PENDING, lease=None)
+
+
+def claim_next_job():
+    """
+    Atomically moves the oldest pending job to running under a fresh lease.
+    """
+    close_old_connections()
+    candidates = PrintJob.objects.filter(status=PrintJob.STATUS_PENDING).order_by("created_at")
+    for pk in candidates.values_list("pk", flat=True)[:10]:
+        lease = uuid.uuid4().hex
+        claimed = PrintJob.objects.filter(pk=pk, status=PrintJob.STATUS_PENDING).update(
+            status=PrintJob.STATUS_RUNNING,
+            lease=lease,
+            heartbeat=timezone.now(),
+            processed=0,
+            failed=0,
+            error=None,
+        )
+        if claimed:
+            return PrintJob.objects.get(pk=pk)
+    return None
+
+
+def update_job(job, **fields):
+    fields["heartbeat"] = timezone.now()
+    if not PrintJob.objects.filter(pk=job.pk, lease=job.lease).update(**fields):
+        raise LeaseLost(f"Print job {job.pk} was taken over by another runner.")
+
+
+def process_job(job):
+    """
+    Renders every slip of the job into one merged PDF on disk.
+
+    Slips already in the PDF cache are read from it and the others are sent to
+    BollaDrawer a small batch at a time, so memory does not grow with the size
+    of the selection. A restarted job is rendered again from the beginning;
+    slips that were already rendered one by one are served from the PDF cache.
+    """
+    os.makedirs(settings.PRINT_JOB_DIR, exist_ok=True)
+    final_path = get_job_path(job)
+    part_path = f"{final_path}.{job.lease}.part"
+
+    slips_by_pk = Slip.objects.select_related("recipient").in_bulk(job.slip_ids)
+    slips = [slips_by_pk[pk] for pk in job.slip_ids if pk in slips_by_pk]
+    missing = len(job.slip_ids) - len(slips)
+
+    try:
+        write_merged_slips(job, slips, part_path, missing)
+
+        os.replace(part_path, final_path)
+        update_job(
+            job,
+            status=PrintJob.STATUS_DONE,
+            file_path=final_path,
+            finished_at=timezone.now(),
+        )
+    except LeaseLost as e:
+        print(e)
+    except Exception as e:
+        print(f"Print job {job.pk} failed: {e}")
+        try:
+            update_job(job, status=PrintJob.STATUS_FAILED, error=str(e), finished_at=timezone.now())
+        except LeaseLost as e:
+            print(e)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+
+def write_merged_slips(job, slips, path, missing):
+    """
+    Streams the merged PDF of slips to path, appending each document as soon
+    as it is available and recording the progress after each one.
+    """
+    processed = failed = missing
+    writer = StreamingPdfWriter()
+
+    with open(path, "wb") as f:
+        f.write(writer.start())
+        for document_slips, pdf_content, document_failed in iter_slip_documents(slips):
+            processed += len(document_slips)
+            failed += document_failed
+            if pdf_content:
+                try:
+                    f.write(writer.add_document(pdf_content))
+                except Exception as e:
+                    numbers = ", ".join(slip.full_slip_number for slip in document_slips)
+                    print(f"Error adding PDF for slips {numbers}: {e}")
+                    failed += len(document_slips) - document_failed
+            update_job(job, processed=processed, failed=failed)
+
+        if not writer.kids:
+            raise SlipRenderError("Nessun PDF è stato generato.")
+        f.write(writer.finish())
@@ -0,0 +1,178 @@
+# file: user_profile/recipient_duplicates.py
+import re
+from collections import defaultdict
+from itertools import combinations
+
+from django.db import transaction
+from django.db.models import Count
+
+from core.models import Recipient, Slip
+from .item_suggestions import rebuild_item_suggestions
+from .recipient_search import get_trigrams, normalize
+from .slip_search import index_slip
+from .summaries import get_summary_key, refresh_summary
+
+# Blocks larger than this are too generic to mean anything (e.g. a shared placeholder
+# VAT number) and are skipped rather than compared pairwise
+MAX_BLOCK_SIZE = 50
+
+# Trigram similarity two names in the same postal code need to be considered duplicates
+NAME_SIMILARITY = 0.6
+
+# Fields copied from a duplicate when the recipient it is merged into has them empty
+MERGED_FIELDS = (
+    "address_line2", "province_sigla", "phone", "email", "vat_number",
+)
+
+
+def normalize_vat(vat_number):
+    vat = re.sub(r"[^0-9a-z]", "", (vat_number or "").lower())
+    # "IT01234567890" and "01234567890" are the same Italian VAT number
+    if vat.startswith("it") and vat[2:].isdigit():
+        vat = vat[2:]
+    return vat
+
+
+def name_similarity(a, b):
+    a, b = get_trigrams(a), get_trigrams(b)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def find_duplicate_groups(queryset=None):
+    """
+    Returns groups of recipients that are probably the same, as lists of pks.
+
+    Rather than comparing every pair, recipients are put into blocks that share
+    a VAT number, a normalized name, or a postal code. Recipients in the same
+    VAT block are duplicates. A shared name alone is not enough, since unrelated
+    firms can have the same name, so within a name block a pair is only merged
+    when it also shares the postal code or the city. Within a postal code
+    block, names are compared pairwise by trigram similarity. Two different VAT
+    numbers always mean two different firms. Blocks are merged into groups with
+    union-find, so the whole run is close to linear in the number of recipients.
+    """
+    queryset = Recipient.objects.all() if queryset is None else queryset
+    rows = list(queryset.values_list("pk", "company_name", "postal_code", "city", "vat_number"))
+
+    parent = {pk: pk for pk, *_ in rows}
+
+    def find(pk):
+        while parent[pk] != pk:
+            parent[pk] = parent[parent[pk]]
+            pk = parent[pk]
+        return pk
+
+    def union(a, b):
+        root_a, root_b = find(a), find(b)
+        if root_a == root_b:
+            return
+        # Checked on whole groups, so a recipient without a VAT number cannot
+        # link two firms with different ones
+        vat_a, vat_b = group_vats[root_a], group_vats[root_b]
+        if vat_a and vat_b and vat_a != vat_b:
+            return
+        root, child = min(root_a, root_b), max(root_a, root_b)
+        parent[child] = root
+        group_vats[root] = vat_a or vat_b
+
+    vat_blocks = defaultdict(list)
+    name_blocks = defaultdict(list)
+    postal_blocks = defaultdict(list)
+    names = {}
+    places = {}
+    group_vats = {}
+    for pk, company_name, postal_code, city, vat_number in rows:
+        names[pk] = normalize(company_name)
+        group_vats[pk] = vat = normalize_vat(vat_number)
+        postal_code = (postal_code or "").strip()
+        places[pk] = (postal_code, normalize(city))
+        if vat:
+            vat_blocks[vat].append(pk)
+        if names[pk]:
+            name_blocks[names[pk]].append(pk)
+        if postal_code:
+            postal_blocks[postal_code].append(pk)
+
+    for block in vat_blocks.values():
+        if 1 < len(block) <= MAX_BLOCK_SIZE:
+            for pk in block[1:]:
+                union(block[0], pk)
+
+    for block in name_blocks.values():
+        if 1 < len(block) <= MAX_BLOCK_SIZE:
+            for a, b in combinations(block, 2):
+                if any(x and x == y for x, y in zip(places[a], places[b])):
+                    union(a, b)
+
+    for block in postal_blocks.values():
+        if 1 < len(block) <= MAX_BLOCK_SIZE:
+            for a, b in combinations(block, 2):
+                if name_similarity(names[a], names[b]) >= NAME_SIMILARITY:
+                    union(a, b)
+
+    groups = defaultdict(list)
+    for pk in parent:
+        groups[find(pk)].append(pk)
+    return sorted(
+        (sorted(group) for group in groups.values() if len(group) > 1),
+        key=lambda group: group[0],
+    )
+
+
+def pick_merge_target(pks):
+    """
+    Returns the recipient of pks with the most slips, the oldest one on a tie.
+    """
+    return (
+        Recipient.objects.filter(pk__in=pks)
+        .annotate(slip_count=Count("slips"))
+        .order_by("-slip_count", "pk")
+        .first()
+    )
+
+
+def merge_recipients(target, duplicates):
+    """
+    Moves every slip of duplicates to target and deletes the duplicates, in one transaction.
+
+    Slips are repointed with a single UPDATE, which bypasses the Slip signals,
+    so the moved slips are reindexed here along with the monthly summaries and
+    the target's item suggestions. Saving target afterwards runs the Recipient
+    receivers, which drop the cached PDFs of all its slips, the moved ones
+    included. Returns the number of slips moved.
+    """
+    duplicates = [recipient for recipient in duplicates if recipient.pk != target.pk]
+    if not duplicates:
+        return 0
+
+    with transaction.atomic():
+        moved = Slip.objects.filter(recipient__in=duplicates)
+        moved_pks = list(moved.values_list("pk", flat=True))
+        summary_keys = {
+            get_summary_key(slip_date, recipient_id, lavorazione)
+            for slip_date, recipient_id, lavorazione in moved.values_list("date", "recipient_id", "lavorazione")
+        }
+        moved.update(recipient=target)
+
+        for field in MERGED_FIELDS:
+            if not getattr(target, field):
+                value = next((getattr(d, field) for d in duplicates if getattr(d, field)), None)
+                setattr(target, field, value)
+        last_used = [r.last_used_at for r in [target, *duplicates] if r.last_used_at]
+        target.last_used_at = max(last_used) if last_used else None
+        target.save()
+
+        for recipient in duplicates:
+            recipient.delete()
+
+        # Their terms still hold the name of the recipient they were moved from
+        for slip in Slip.objects.filter(pk__in=moved_pks).prefetch_related("slip_items").iterator(chunk_size=500):
+            slip.recipient = target
+            index_slip(slip)
+        for year, month, _, lavorazione in summary_keys:
+            refresh_summary((year, month, target.pk, lavorazione))
+        rebuild_item_suggestions(recipient_id=target.pk)
+
+    return len(moved_pks)
@@ -0,0 +1,149 @@
+# file: user_profile/recipient_search.py
+import math
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Subquery, Value, When
+
+from core.models import Recipient, RecipientTrigram
+from .slip_search import tokenize
+
+AUTOCOMPLETE_LIMIT = 10
+RECIPIENTS_PER_PAGE = 50
+
+# Dropped from search keys, so "Moda S.R.L." and "Moda srl" both become "moda"
+LEGAL_SUFFIXES = {
+    "srl", "srls", "spa", "snc", "sas", "sapa", "scarl", "scrl", "ss",
+    "ltd", "llc", "inc", "gmbh", "sarl",
+}
+
+# Share of the query's trigrams a recipient must contain to count as a fuzzy match
+MIN_TRIGRAM_SHARE = 0.4
+AUTOCOMPLETE_FIELDS = ("id", "company_name", "city", "vat_number", "last_used_at")
+SEARCH_FIELDS = ("company_name", "city", "vat_number")
+
+
+def by_recent_use(queryset):
+    return queryset.order_by(F("last_used_at").desc(nulls_last=True), "company_name")
+
+
+def autocomplete_recipients(query, limit=AUTOCOMPLETE_LIMIT):
+    """
+    Returns up to limit recipients whose name, city or VAT number starts with
+    query, most recently used first. An empty query returns the most recently
+    used recipients.
+
+    Each field is matched by a separate prefix lookup and the three are
+    combined with UNION, so every branch is a range scan of that column's
+    index instead of one OR that makes the database scan the whole table.
+    Only when there are fewer than limit prefix matches is the list filled up
+    with the trigram search, which reads the query's trigram rows rather than
+    every recipient.
+    """
+    recipients = Recipient.objects.only(*AUTOCOMPLETE_FIELDS)
+    query = (query or "").strip()
+    if not query:
+        return list(by_recent_use(recipients)[:limit])
+
+    branches = [
+        recipients.filter(**{f"{field}__istartswith": query}).order_by()
+        for field in SEARCH_FIELDS
+    ]
+    results = list(by_recent_use(branches[0].union(*branches[1:]))[:limit])
+    if len(results) >= limit:
+        return results
+
+    results += search_recipients(
+        query, recipients.exclude(pk__in=[recipient.pk for recipient in results])
+    )[:limit - len(results)]
+    return results
+
+
+def normalize(text):
+    """
+    Lowercases and accent-folds text, drops punctuation and legal suffixes.
+    Runs of single letters are joined first, so "S.R.L." is recognised as "srl".
+    """
+    words = []
+    letters = ""
+    for token in tokenize(text):
+        if len(token) == 1 and token.isalpha():
+            letters += token
+            continue
+        if letters:
+            words.append(letters)
+            letters = ""
+        words.append(token)
+    if letters:
+        words.append(letters)
+    return " ".join(word for word in words if word not in LEGAL_SUFFIXES)
+
+
+def get_search_key(recipient):
+    return normalize(
+        " ".join(filter(None, [recipient.company_name, recipient.city, recipient.vat_number]))
+    )[:512]
+
+
+def get_trigrams(key):
+    """
+    Returns the trigrams of every word of a normalized key, padded like
+    PostgreSQL's pg_trgm so that word starts weigh more.
+    """
+    trigrams = set()
+    for word in key.split():
+        padded = f"  {word} "
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+def index_recipient(recipient):
+    """
+    Replaces the stored trigrams of a recipient with those of its search key.
+    """
+    with transaction.atomic():
+        RecipientTrigram.objects.filter(recipient=recipient).delete()
+        RecipientTrigram.objects.bulk_create(
+            RecipientTrigram(recipient=recipient, trigram=trigram)
+            for trigram in get_trigrams(recipient.search_key)
+        )
+
+
+def search_recipients(query, queryset=None):
+    """
+    Returns the recipients matching query by name, city or VAT number, best first.
+
+    Both sides are normalized, so accents, punctuation and legal suffixes don't
+    matter. A recipient matches when its key contains the query, or shares at
+    least MIN_TRIGRAM_SHARE of the query's trigrams, which tolerates typos.
+    Recipients containing the query rank first, then by shared trigrams.
+    """
+    queryset = Recipient.objects.all() if queryset is None else queryset
+    key = normalize(query)
+    trigrams = get_trigrams(key)
+    if not trigrams:
+        return queryset.order_by("company_name")
+
+    min_shared = max(1, math.ceil(len(trigrams) * MIN_TRIGRAM_SHARE))
+    matches = RecipientTrigram.objects.filter(trigram__in=trigrams)
+    candidates = (
+        matches.values("recipient_id")
+        .annotate(shared=Count("pk"))
+        .filter(shared__gte=min_shared)
+        .values("recipient_id")
+    )
+    shared = (
+        matches.filter(recipient=OuterRef("pk"))
+        .values("recipient_id")
+        .annotate(shared=Count("pk"))
+        .values("shared")
+    )
+    return (
+        queryset.filter(pk__in=candidates)
+        .annotate(
+            shared_trigrams=Subquery(shared, output_field=IntegerField()),
+            contains_query=Case(
+                When(search_key__contains=key, then=Value(1)), default=Value(0)
+            ),
+        )
+        .order_by("-contains_query", "-shared_trigrams", "company_name")
+    )
@@ -0,0 +1,169 @@
+# file: user_profile/render_limits.py
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; only the process-wide limit applies there
+    fcntl = None
+
+
+class RenderGate:
+    """
+    Admission control for BollaDrawer renders.
+
+    At most max_concurrent renders run at once in this process; callers above
+    that wait in line. When host_limit is set, renders also need one of
+    host_limit slot files under lock_dir, locked with flock, which caps the
+    number of concurrent renders across every process on the host.
+    """
+
+    def __init__(self, max_concurrent, host_limit=0, lock_dir=None, poll_interval=0.05):
+        self.max_concurrent = max_concurrent
+        self.host_limit = host_limit if fcntl is not None else 0
+        self.lock_dir = lock_dir
+        self.poll_interval = poll_interval
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.running = 0
+        self.admitted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @contextmanager
+    def slot(self):
+        started = time.monotonic()
+        with self._lock:
+            self.waiting += 1
+        try:
+            self._semaphore.acquire()
+            try:
+                host_slot = self._acquire_host_slot()
+            except BaseException:
+                self._semaphore.release()
+                raise
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+        waited = time.monotonic() - started
+        with self._lock:
+            self.running += 1
+            self.admitted += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+        try:
+            yield
+        finally:
+            self._release_host_slot(host_slot)
+            self._semaphore.release()
+            with self._lock:
+                self.running -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "host_limit": self.host_limit,
+                "running": self.running,
+                "queue_depth": self.waiting,
+                "admitted": self.admitted,
+                "avg_wait_seconds": self.total_wait / self.admitted if self.admitted else 0.0,
+                "max_wait_seconds": self.max_wait,
+            }
+
+    def _acquire_host_slot(self):
+        if not self.host_limit:
+            return None
+        os.makedirs(self.lock_dir, exist_ok=True)
+        while True:
+            for index in range(self.host_limit):
+                slot_file = open(os.path.join(self.lock_dir, f"slot-{index}.lock"), "a+b")
+                try:
+                    fcntl.flock(slot_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return slot_file
+                except BlockingIOError:
+                    slot_file.close()
+            time.sleep(self.poll_interval)
+
+    @staticmethod
+    def _release_host_slot(slot_file):
+        if slot_file is None:
+            return
+        try:
+            fcntl.flock(slot_file, fcntl.LOCK_UN)
+        finally:
+            slot_file.close()
+
+
+class InFlightRenders:
+    """
+    Collapses identical concurrent renders: the first caller for a key renders,
+    later callers with the same key wait for and share its result.
+    """
+
+    class Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.collapsed = 0
+
+    def run(self, key, render):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self.Call()
+            else:
+                self.collapsed += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = render()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._calls), "collapsed": self.collapsed}
+
+
+_gate = None
+_gate_lock = threading.Lock()
+in_flight_renders = InFlightRenders()
+
+
+def get_render_gate():
+    """
+    Returns the process-wide render gate.
+    """
+    global _gate
+    with _gate_lock:
+        if _gate is None:
+            _gate = RenderGate(
+                settings.SLIP_RENDER_MAX_CONCURRENCY,
+                settings.SLIP_RENDER_HOST_LIMIT,
+                settings.SLIP_RENDER_LOCK_DIR,
+            )
+        return _gate
@@ -0,0 +1,81 @@
+# file: user_profile/responses.py
+import os
+import re
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, StreamingHttpResponse
+
+CHUNK_SIZE = 64 * 1024
+
+
+async def aiter_chunks(chunks):
+    """
+    Feeds a blocking chunk generator to an ASGI response one chunk at a time.
+    """
+    done = object()
+    next_chunk = sync_to_async(next, thread_sensitive=False)
+    try:
+        while True:
+            chunk = await next_chunk(chunks, done)
+            if chunk is done:
+                break
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close, thread_sensitive=False)()
+
+
+def streaming_response(request, chunks, **kwargs):
+    """
+    Builds a StreamingHttpResponse that stays streaming under both WSGI and ASGI.
+    Under ASGI Django reads a sync iterator into a list before sending it.
+    """
+    if hasattr(request, "scope"):
+        chunks = aiter_chunks(chunks)
+    return StreamingHttpResponse(chunks, **kwargs)
+
+
+def iter_file(path, start=0, length=None):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining is None or remaining > 0:
+            size = CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining)
+            chunk = f.read(size)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def ranged_file_response(request, path, filename, content_type="application/pdf"):
+    """
+    Serves a file with support for single `Range: bytes=` requests, so that an
+    interrupted download can be resumed.
+    """
+    size = os.path.getsize(path)
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", request.headers.get("Range", "").strip())
+
+    if match and (match[1] or match[2]):
+        if match[1]:
+            start = int(match[1])
+            end = min(int(match[2]), size - 1) if match[2] else size - 1
+        else:
+            start = max(size - int(match[2]), 0)
+            end = size - 1
+        if start > end:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+        response = streaming_response(
+            request, iter_file(path, start, end - start + 1), status=206, content_type=content_type
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = str(end - start + 1)
+    else:
+        response = streaming_response(request, iter_file(path), content_type=content_type)
+        response["Content-Length"] = str(size)
+
+    response["Accept-Ranges"] = "bytes"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,142 @@
+# file: user_profile/signals.py
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import Recipient, Slip
+from .item_suggestions import update_item_suggestions
+from .pdf_cache import get_pdf_cache, invalidate_recipient_pdfs_in_background
+from .prerender import cancel_prerender, schedule_prerender
+from .recipient_search import get_search_key, index_recipient
+from .slip_search import index_slip
+from .summaries import get_summary_key, refresh_summary
+
+
+@receiver(post_save, sender=Slip)
+@receiver(post_delete, sender=Slip)
+def invalidate_slip_pdf(sender, instance, **kwargs):
+    get_pdf_cache().invalidate_slip(instance.pk)
+
+
+@receiver(post_save, sender=Slip)
+def index_slip_for_search(sender, instance, raw=False, **kwargs):
+    # Slip.save() writes the SlipItem rows after post_save, so wait for its transaction
+    if not raw:
+        transaction.on_commit(lambda: index_slip(instance))
+
+
+@receiver(post_save, sender=Slip)
+def touch_slip_recipient(sender, instance, raw=False, **kwargs):
+    # update() rather than save(), so the recipient's own post_save receivers don't run
+    if not raw:
+        Recipient.objects.filter(pk=instance.recipient_id).update(last_used_at=timezone.now())
+
+
+@receiver(post_save, sender=Slip)
+def prerender_slip_pdf(sender, instance, raw=False, **kwargs):
+    if settings.SLIP_PDF_PRERENDER and not raw:
+        transaction.on_commit(lambda: schedule_prerender(instance.pk))
+
+
+@receiver(post_delete, sender=Slip)
+def cancel_slip_prerender(sender, instance, **kwargs):
+    cancel_prerender(instance.pk)
+
+
+@receiver(pre_save, sender=Slip)
+def remember_previous_slip(sender, instance, raw=False, **kwargs):
+    # An edit can move the slip to another month, recipient or lavorazione, in
+    # which case the summary it used to count towards must be refreshed too, and
+    # the item suggestions need the items it had. Both come from one query.
+    instance._previous_summary_key = None
+    instance._previous_items = None
+    if instance.pk and not raw:
+        previous = (
+            Slip.objects.filter(pk=instance.pk)
+            .values_list("date", "recipient_id", "lavorazione", "items")
+            .first()
+        )
+        if previous:
+            slip_date, recipient_id, lavorazione, items = previous
+            instance._previous_summary_key = get_summary_key(slip_date, recipient_id, lavorazione)
+            instance._previous_items = (recipient_id, items)
+
+
+@receiver(post_save, sender=Slip)
+def update_slip_summary(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    key = get_summary_key(instance.date, instance.recipient_id, instance.lavorazione)
+    previous_key = getattr(instance, "_previous_summary_key", None)
+
+    # Deferred like the search index, as the quantities are summed from the SlipItem rows
+    def refresh():
+        refresh_summary(key)
+        if previous_key and previous_key != key:
+            refresh_summary(previous_key)
+
+    transaction.on_commit(refresh)
+
+
+@receiver(post_delete, sender=Slip)
+def remove_slip_from_summary(sender, instance, **kwargs):
+    refresh_summary(get_summary_key(instance.date, instance.recipient_id, instance.lavorazione))
+
+
+@receiver(post_save, sender=Slip)
+def update_slip_item_suggestions(sender, instance, raw=False, **kwargs):
+    if not raw:
+        update_item_suggestions(
+            getattr(instance, "_previous_items", None),
+            (instance.recipient_id, instance.items),
+        )
+
+
+@receiver(post_delete, sender=Slip)
+def remove_slip_item_suggestions(sender, instance, **kwargs):
+    update_item_suggestions((instance.recipient_id, instance.items), None)
+
+
+@receiver(pre_save, sender=Recipient)
+def set_recipient_search_key(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.search_key = get_search_key(instance)
+
+
+@receiver(post_save, sender=Recipient)
+def index_recipient_for_search(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_recipient(instance)
+
+
+@receiver(post_save, sender=Recipient)
+def invalidate_recipient_slip_pdfs(sender, instance, created, **kwargs):
+    # Deleting a recipient cascades to its slips, which are handled above
+    # Cached PDFs are keyed by their content, so stale ones are never served: this
+    # only frees the disk space, and does it after the response
+    if created:
+        return
+    recipient_pk = instance.pk
+    transaction.on_commit(lambda: invalidate_recipient_pdfs_in_background(recipient_pk))
+
+
+@receiver(pre_save, sender=Recipient)
+def remember_recipient_company_name(sender, instance, raw=False, **kwargs):
+    instance._previous_company_name = None
+    if instance.pk and not raw:
+        instance._previous_company_name = (
+            Recipient.objects.filter(pk=instance.pk).values_list("company_name", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Recipient)
+def reindex_recipient_slips(sender, instance, created, raw=False, **kwargs):
+    # Only the company name is indexed, so other edits leave the slips' terms unchanged
+    if created or raw or getattr(instance, "_previous_company_name", None) in (None, instance.company_name):
+        return
+    for slip in instance.slips.prefetch_related("slip_items").iterator(chunk_size=500):
+        # Reuse the saved recipient instead of fetching it again for every slip
+        slip.recipient = instance
+        index_slip(slip)
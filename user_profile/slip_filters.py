@@ -0,0 +1,169 @@
+# file: user_profile/slip_filters.py
+from datetime import date
+
+from django.db.models import Q
+
+from core.models import Slip
+from .slip_search import matching_slips
+
+SLIPS_PER_PAGE = 50
+
+LAVORAZIONI = [
+    "Smacchinatura",
+    "Taglio",
+    "Confezione",
+    "Ricamo/Applicazione",
+    "Da Trattare",
+    "Asole/Bottoni",
+]
+
+# Columns rendered by the dashboard table
+DASHBOARD_FIELDS = (
+    "id",
+    "slip_number",
+    "slip_year",
+    "full_slip_number",
+    "date",
+    "lavorazione",
+    "total_quantity",
+    "recipient__company_name",
+)
+
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_slip_filters(params):
+    """
+    Reads the dashboard filters from a QueryDict, dropping empty or invalid values.
+    """
+    filters = {
+        "q": (params.get("q") or "").strip(),
+        "number": (params.get("number") or "").strip(),
+        "year": parse_int(params.get("year")),
+        "date_from": parse_date(params.get("date_from")),
+        "date_to": parse_date(params.get("date_to")),
+        "recipient": parse_int(params.get("recipient")),
+        "lavorazione": (params.get("lavorazione") or "").strip(),
+        "start_number": parse_int(params.get("start_slip_number")),
+        "start_year": parse_int(params.get("start_slip_year")),
+        "end_number": parse_int(params.get("end_slip_number")),
+        "end_year": parse_int(params.get("end_slip_year")),
+    }
+    return {key: value for key, value in filters.items() if value not in (None, "")}
+
+
+def filter_slips(queryset, filters):
+    """
+    Applies the filters returned by get_slip_filters to a Slip queryset.
+    A number can be given either alone ("12") or with its year ("12-2024").
+    A number range is bounded by (year, number) pairs; a bound without a year is ignored.
+    """
+    if "q" in filters:
+        queryset = matching_slips(filters["q"], queryset)
+    number = filters.get("number")
+    if number:
+        slip_number, _, slip_year = number.partition("-")
+        if parse_int(slip_number) is not None:
+            queryset = queryset.filter(slip_number=int(slip_number))
+            if parse_int(slip_year) is not None:
+                queryset = queryset.filter(slip_year=int(slip_year))
+        else:
+            queryset = queryset.filter(full_slip_number__startswith=number)
+    if "year" in filters:
+        queryset = queryset.filter(slip_year=filters["year"])
+    if "date_from" in filters:
+        queryset = queryset.filter(date__gte=filters["date_from"])
+    if "date_to" in filters:
+        queryset = queryset.filter(date__lte=filters["date_to"])
+    if "recipient" in filters:
+        queryset = queryset.filter(recipient_id=filters["recipient"])
+    if "lavorazione" in filters:
+        queryset = queryset.filter(lavorazione=filters["lavorazione"])
+    if "start_year" in filters:
+        start_year = filters["start_year"]
+        queryset = queryset.filter(
+            Q(slip_year__gt=start_year)
+            | Q(slip_year=start_year, slip_number__gte=filters.get("start_number", 0))
+        )
+    if "end_year" in filters:
+        end_year = filters["end_year"]
+        if "end_number" in filters:
+            queryset = queryset.filter(
+                Q(slip_year__lt=end_year)
+                | Q(slip_year=end_year, slip_number__lte=filters["end_number"])
+            )
+        else:
+            queryset = queryset.filter(slip_year__lte=end_year)
+    return queryset
+
+
+def encode_cursor(slip):
+    return f"{slip.date.isoformat()}.{slip.slip_number}.{slip.pk}"
+
+
+def decode_cursor(cursor):
+    try:
+        slip_date, slip_number, pk = cursor.split(".")
+        return date.fromisoformat(slip_date), int(slip_number), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def paginate_slips(queryset, after=None, before=None, per_page=SLIPS_PER_PAGE):
+    """
+    Keyset pagination over (-date, -slip_number), with the primary key as a tiebreaker.
+
+    Instead of an OFFSET, which makes the database walk every skipped row, each
+    page starts right after the last row of the previous one ("after") or ends
+    right before the first row of the next one ("before"). Returns the page's
+    slips along with the cursors of the neighbouring pages, or None where there
+    is no such page.
+    """
+    after = decode_cursor(after)
+    before = decode_cursor(before)
+
+    if before is not None:
+        slip_date, slip_number, pk = before
+        queryset = queryset.filter(
+            Q(date__gt=slip_date)
+            | Q(date=slip_date, slip_number__gt=slip_number)
+            | Q(date=slip_date, slip_number=slip_number, pk__gt=pk)
+        ).order_by("date", "slip_number", "pk")
+    else:
+        if after is not None:
+            slip_date, slip_number, pk = after
+            queryset = queryset.filter(
+                Q(date__lt=slip_date)
+                | Q(date=slip_date, slip_number__lt=slip_number)
+                | Q(date=slip_date, slip_number=slip_number, pk__lt=pk)
+            )
+        queryset = queryset.order_by("-date", "-slip_number", "-pk")
+
+    # One extra row tells whether there is a further page in this direction
+    slips = list(queryset[:per_page + 1])
+    has_more = len(slips) > per_page
+    slips = slips[:per_page]
+
+    if before is not None:
+        slips.reverse()
+        has_newer, has_older = has_more, True
+    else:
+        has_newer, has_older = after is not None, has_more
+
+    return {
+        "slips": slips,
+        "newer_cursor": encode_cursor(slips[0]) if slips and has_newer else None,
+        "older_cursor": encode_cursor(slips[-1]) if slips and has_older else None,
+    }
@@ -0,0 +1,69 @@
+# file: user_profile/slip_numbers.py
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+
+from core.models import Slip, SlipNumberSequence
+
+
+def get_sequence(year, lock=False):
+    """
+    Returns the year's sequence row, creating it on first use from the highest
+    slip number already recorded for that year.
+    """
+    sequences = SlipNumberSequence.objects.select_for_update() if lock else SlipNumberSequence.objects
+    sequence = sequences.filter(year=year).first()
+    if sequence is not None:
+        return sequence
+
+    last = Slip.objects.filter(slip_year=year).aggregate(Max("slip_number"))["slip_number__max"]
+    try:
+        with transaction.atomic():
+            return SlipNumberSequence.objects.create(year=year, next_number=(last or 0) + 1)
+    except IntegrityError:
+        # Created concurrently by another request
+        return sequences.get(year=year)
+
+
+def get_next_slip_number(year):
+    """
+    Returns the number the next slip of the year will most likely get, without
+    reserving it. Used to pre-fill the slip form.
+    """
+    return get_sequence(year).next_number
+
+
+def reserve_slip_number(year, number=None):
+    """
+    Reserves a slip number for the year and returns it.
+
+    Without a number, the next free one from the sequence is taken. An explicit
+    number is accepted as is, and moves the sequence past it when it is higher.
+    Must run inside a transaction: the sequence row stays locked until it
+    commits, so concurrent reservations for the same year are serialized and a
+    rolled back slip gives its number back.
+    """
+    sequence = get_sequence(year, lock=True)
+    if number is None:
+        number = sequence.next_number
+        # Skip numbers taken outside the sequence, e.g. by editing an older slip
+        while Slip.objects.filter(slip_year=year, slip_number=number).exists():
+            number += 1
+    if number >= sequence.next_number:
+        sequence.next_number = number + 1
+        sequence.save(update_fields=["next_number"])
+    return number
+
+
+def get_number_gaps(year):
+    """
+    Returns the numbers below the year's next number that no slip uses:
+    numbers that were handed out but whose slip was deleted or renumbered.
+    """
+    sequence = SlipNumberSequence.objects.filter(year=year).first()
+    if sequence is None:
+        return []
+    used = set(
+        Slip.objects.filter(slip_year=year, slip_number__lt=sequence.next_number)
+        .values_list("slip_number", flat=True)
+    )
+    return [number for number in range(1, sequence.next_number) if number not in used]
@@ -0,0 +1,527 @@
+# file: user_profile/slip_pdf.py
+import atexit
+import concurrent.futures
+import json
+import os
+import queue
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+from .pdf_cache import get_pdf_cache
+from .render_limits import get_render_gate, in_flight_renders
+
+
+class SlipRenderError(Exception):
+    """
+    Raised when BollaDrawer fails to produce a PDF for a slip.
+    """
+
+
+def get_drawer_dir():
+    return os.path.join(settings.BASE_DIR, "core", "static", "programs", "SlipDrawer")
+
+
+def get_jar_path():
+    return os.path.join(get_drawer_dir(), "BollaDrawer-1.0-SNAPSHOT.jar")
+
+
+def get_worker_class_path():
+    return os.path.join(get_drawer_dir(), "BollaWorker.class")
+
+
+def get_static_files_path():
+    return os.path.join(settings.BASE_DIR, "core", "static")
+
+
+def build_bolla_data(slip):
+    """
+    Builds the JSON payload expected by BollaDrawer for a given slip.
+    """
+    items = slip.items or []
+    descrizioni = [item.get("description", "") for item in items]
+    qta = [str(item.get("quantity", "")) for item in items]
+    um = [item.get("unit", "") for item in items]
+    item_notes = [item.get("note", "---") for item in items]
+
+    recipient_data = {
+        "usr": slip.recipient.company_name,
+        "riga1": slip.recipient.address_line1,
+        "riga2": slip.recipient.address_line2 or "",
+        "citta": slip.recipient.city,
+        "prov": slip.recipient.province_sigla or "",
+        "cap": slip.recipient.postal_code,
+        "paese": slip.recipient.country,
+    }
+
+    same_address = not slip.different_address
+    dst2_data = []
+    if not same_address:
+        addr = slip.different_address
+        dst2_data = [
+            addr.get("dest_name", ""),
+            addr.get("dest_address", ""),
+            addr.get("dest_city", ""),
+            addr.get("dest_cap", ""),
+            addr.get("dest_state", ""),
+        ]
+
+    return {
+        "data": slip.date.strftime("%d/%m/%Y"),
+        "descrizioni": descrizioni,
+        "qta": qta,
+        "um": um,
+        "note": item_notes,
+        "lavorazione": slip.lavorazione or "",
+        "respSpedizione": slip.resp_spedizione or "",
+        "dataTrasp": slip.data_trasp.strftime("%d/%m/%Y") if slip.data_trasp else "",
+        "aspetto": slip.aspetto or "",
+        "dst": recipient_data,
+        "sameAddress": same_address,
+        "dst2": dst2_data,
+        "number": str(slip.slip_number),
+        "year": str(slip.slip_year),
+    }
+
+
+def find_generated_pdf(temp_dir, number, year):
+    """
+    Searches temp_dir recursively for the PDF written by BollaDrawer.
+
+    The jar may write the PDF in different locations or with slightly different
+    filename formats (for example it may create a "Bolle" subdirectory or
+    replace characters), so we match on candidate names or on number and year.
+    """
+    candidates = {
+        f"{number}-{year}.pdf",
+        f"{number}_{year}.pdf",
+        f"{number}.{year}.pdf",
+    }
+
+    for root, dirs, files in os.walk(temp_dir):
+        for fname in files:
+            if not fname.lower().endswith(".pdf"):
+                continue
+            if fname in candidates or (str(number) in fname and str(year) in fname):
+                return os.path.join(root, fname)
+    return None
+
+
+def render_one_shot(bolla_data):
+    """
+    Renders a PDF by spawning a fresh `java -jar` process, as BollaDrawer was
+    originally meant to be used. Returns the PDF bytes.
+    """
+    json_string = json.dumps(bolla_data)
+    number, year = bolla_data["number"], bolla_data["year"]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        command = ["java", "-jar", get_jar_path(), json_string, temp_dir, get_static_files_path()]
+
+        try:
+            result = subprocess.run(command, check=True, capture_output=True, text=True)
+        except subprocess.CalledProcessError as e:
+            error_message = f"Errore nella generazione del PDF: {e.stderr}"
+            if e.stdout:
+                error_message += f"\nOutput: {e.stdout}"
+            raise SlipRenderError(error_message)
+        except OSError as e:
+            raise SlipRenderError(f"Errore nell'avvio di BollaDrawer: {e}")
+
+        # Log stdout/stderr for debugging
+        if result.stdout:
+            print(result.stdout)
+        if result.stderr:
+            print(result.stderr)
+
+        found_pdf = find_generated_pdf(temp_dir, number, year)
+        if found_pdf:
+            with open(found_pdf, "rb") as f:
+                return f.read()
+
+        # Collect generated PDFs (if any) for diagnostics
+        generated_pdfs = []
+        for root, dirs, files in os.walk(temp_dir):
+            for fname in files:
+                if fname.lower().endswith(".pdf"):
+                    generated_pdfs.append(os.path.join(root, fname))
+
+        error_message = "Il file PDF non è stato generato o non è stato trovato."
+        if result.stdout:
+            error_message += f" Stdout: {result.stdout}"
+        if result.stderr:
+            error_message += f" Stderr: {result.stderr}"
+        if generated_pdfs:
+            error_message += f" PDF trovati: {generated_pdfs}"
+        raise SlipRenderError(error_message)
+
+
+class WorkerError(Exception):
+    """
+    Raised when a pooled worker crashes, hangs or breaks the protocol.
+    """
+
+
+class BollaDrawerWorker:
+    """
+    A single long-lived JVM running BollaWorker against the BollaDrawer jar.
+
+    The JVM, PDFBox and the font tables are loaded once; each request is a
+    single line of JSON on stdin, answered by "OK <length>" plus the PDF bytes
+    or by "ERR <message>" on stdout.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.process = None
+        # Whether the current JVM has answered at all, to tell a failed start from a crash
+        self.responded = False
+
+    def start(self):
+        if os.path.exists(get_worker_class_path()):
+            # Compiled by `manage.py build_bolla_worker`, runs on a plain JRE
+            command = [
+                "java",
+                "-cp",
+                os.pathsep.join([get_drawer_dir(), get_jar_path()]),
+                "BollaWorker",
+                get_static_files_path(),
+            ]
+        else:
+            # Source-file mode needs a full JDK and compiles the worker on every start
+            command = [
+                "java",
+                "-cp",
+                get_jar_path(),
+                os.path.join(get_drawer_dir(), "BollaWorker.java"),
+                get_static_files_path(),
+            ]
+        self.responded = False
+        # stderr is inherited so the drawer's logging ends up in the server log
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            cwd=get_drawer_dir(),
+        )
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            self.process.kill()
+            self.process.wait(timeout=5)
+        except Exception:
+            pass
+        self.process = None
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def render(self, json_string, on_progress=None):
+        """
+        Sends one request to the worker and returns the PDF bytes.
+
+        For batch requests the worker reports progress after each slip; the
+        watchdog is re-armed on every report, so the timeout applies per slip.
+        """
+        if not self.is_alive():
+            try:
+                self.restart()
+            except OSError as e:
+                raise WorkerError(f"Impossibile avviare il worker BollaDrawer: {e}")
+
+        process = self.process
+        # A hung JVM is killed by the watchdog, which unblocks the pipe reads below
+        watchdog = self._arm_watchdog(process)
+        try:
+            process.stdin.write(json_string.encode("utf-8") + b"\n")
+            process.stdin.flush()
+
+            header = process.stdout.readline().decode("utf-8", "replace").strip()
+            if header:
+                self.responded = True
+            while header.startswith("PROGRESS "):
+                watchdog.cancel()
+                watchdog = self._arm_watchdog(process)
+                if on_progress is not None:
+                    done, failed = (int(value) for value in header.split()[1:3])
+                    try:
+                        on_progress(done, failed)
+                    except Exception:
+                        # The rest of the response is abandoned, so the worker cannot be reused
+                        self.stop()
+                        raise
+                header = process.stdout.readline().decode("utf-8", "replace").strip()
+
+            if header.startswith("OK "):
+                length = int(header[3:])
+                content = process.stdout.read(length)
+                if len(content) != length:
+                    raise WorkerError("Risposta troncata dal worker BollaDrawer.")
+                return content
+            if header.startswith("ERR"):
+                raise SlipRenderError(f"Errore nella generazione del PDF: {header[4:]}")
+            raise WorkerError(f"Risposta non valida dal worker BollaDrawer: {header!r}")
+        except (OSError, ValueError) as e:
+            raise WorkerError(f"Worker BollaDrawer non disponibile: {e}")
+        finally:
+            watchdog.cancel()
+
+    def _arm_watchdog(self, process):
+        watchdog = threading.Timer(self.timeout, process.kill)
+        watchdog.daemon = True
+        watchdog.start()
+        return watchdog
+
+
+class BollaDrawerPool:
+    """
+    A fixed-size pool of BollaDrawerWorker processes.
+
+    Workers are started lazily, restarted when they crash or hang, and a
+    request that cannot be served by the pool falls back to one-shot mode.
+    When a worker dies before answering anything, e.g. because the host has
+    no JDK to run BollaWorker.java, the pool stops starting workers for
+    restart_cooldown seconds and renders in one-shot mode meanwhile.
+    """
+
+    def __init__(self, size, timeout, restart_cooldown=60):
+        self.size = size
+        self.timeout = timeout
+        self.restart_cooldown = restart_cooldown
+        self.cooldown_until = 0
+        self.idle = queue.Queue()
+        for _ in range(size):
+            self.idle.put(BollaDrawerWorker(timeout))
+
+    @property
+    def cooling_down(self):
+        return time.monotonic() < self.cooldown_until
+
+    def render(self, bolla_data):
+        if self.cooling_down:
+            return render_one_shot(bolla_data)
+        json_string = json.dumps(bolla_data)
+        worker = self.idle.get()
+        try:
+            try:
+                return worker.render(json_string)
+            except WorkerError as e:
+                self._worker_failed(worker, e)
+        finally:
+            self.idle.put(worker)
+        return render_one_shot(bolla_data)
+
+    def render_batch(self, bolla_data_list, on_progress=None):
+        """
+        Renders several payloads into one multi-page PDF in a single worker
+        request. Returns None if the worker failed or the pool is cooling down,
+        so the caller can fall back to rendering the slips one by one.
+        """
+        if self.cooling_down:
+            return None
+        json_string = json.dumps(bolla_data_list)
+        worker = self.idle.get()
+        try:
+            return worker.render(json_string, on_progress)
+        except WorkerError as e:
+            self._worker_failed(worker, e)
+            return None
+        finally:
+            self.idle.put(worker)
+
+    def _worker_failed(self, worker, error):
+        print(f"BollaDrawer worker failed, restarting it: {error}")
+        if not worker.responded:
+            print(f"BollaDrawer worker failed to start, using one-shot mode for {self.restart_cooldown}s")
+            self.cooldown_until = time.monotonic() + self.restart_cooldown
+        worker.stop()
+
+    def shutdown(self):
+        while True:
+            try:
+                worker = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.stop()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Returns the process-wide worker pool, or None when pooling is disabled.
+    """
+    global _pool
+    if settings.SLIP_DRAWER_POOL_SIZE <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = BollaDrawerPool(
+                settings.SLIP_DRAWER_POOL_SIZE,
+                settings.SLIP_DRAWER_TIMEOUT,
+                settings.SLIP_DRAWER_RESTART_COOLDOWN,
+            )
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def render_pdf(bolla_data):
+    """
+    Renders a BollaDrawer payload to PDF bytes, using the worker pool when
+    enabled and the one-shot `java -jar` mode otherwise.
+    Raises SlipRenderError if generation fails.
+    """
+    pool = get_pool()
+    with get_render_gate().slot():
+        if pool is None:
+            return render_one_shot(bolla_data)
+        return pool.render(bolla_data)
+
+
+def render_slip_pdf(slip):
+    """
+    Returns the PDF bytes for a slip, served from the on-disk cache when the
+    exact same payload has already been rendered. Concurrent requests for the
+    same payload share a single render.
+    Raises SlipRenderError if generation fails.
+    """
+    bolla_data = build_bolla_data(slip)
+    cache = get_pdf_cache()
+    key = cache.key_for(bolla_data)
+    if cache.enabled:
+        content = cache.get(key)
+        if content is not None:
+            return content
+
+    def render_and_store():
+        content = render_pdf(bolla_data)
+        if cache.enabled:
+            cache.put(key, content, slip_pk=slip.pk)
+        return content
+
+    return in_flight_renders.run(key, render_and_store)
+
+
+def render_batch_pdf(slips, on_progress=None):
+    """
+    Renders several slips into a single multi-page PDF with one BollaDrawer
+    invocation, so no Python-side merge is needed. on_progress(done, failed) is
+    called after each slip.
+
+    Returns None when batch rendering is not available (pooling disabled or the
+    worker failed), so the caller can fall back to rendering slips one by one.
+    Raises SlipRenderError if none of the slips could be rendered.
+    """
+    pool = get_pool()
+    if pool is None:
+        return None
+    bolla_data_list = [build_bolla_data(slip) for slip in slips]
+    with get_render_gate().slot():
+        return pool.render_batch(bolla_data_list, on_progress)
+
+
+def generate_slip_pdf(slip):
+    """
+    Generates a PDF for a given slip and returns its content as bytes.
+    Returns None if generation fails.
+    """
+    try:
+        return render_slip_pdf(slip)
+    except SlipRenderError as e:
+        print(f"Error generating PDF for slip {slip.full_slip_number}: {e}")
+        return None
+
+
+def iter_rendered_slips(slips, render):
+    """
+    Yields (slip, render(slip)) in the order of slips while rendering a few
+    slips ahead in a thread pool. At most twice the worker count of results is
+    held at any time, so memory does not grow with the number of slips.
+    """
+    max_workers = max(settings.SLIP_DRAWER_POOL_SIZE, 1)
+    window = max_workers * 2
+    slips = iter(slips)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for slip in slips:
+            pending.append((slip, executor.submit(render, slip)))
+            if len(pending) >= window:
+                break
+        while pending:
+            slip, future = pending.popleft()
+            next_slip = next(slips, None)
+            if next_slip is not None:
+                pending.append((next_slip, executor.submit(render, next_slip)))
+            yield slip, future.result()
+
+
+def get_cached_slip_pdf(slip):
+    """
+    Returns the cached PDF bytes of a slip, or None when it was not rendered yet.
+    """
+    cache = get_pdf_cache()
+    if not cache.enabled:
+        return None
+    return cache.get(cache.key_for(build_bolla_data(slip)))
+
+
+def iter_slip_documents(slips):
+    """
+    Yields (slips, pdf_content, failed) in order until every slip is covered.
+    Slips already in the PDF cache are served from it; consecutive uncached
+    slips are rendered in batches of at most twice the worker count, so a print
+    with nothing cached costs a few BollaDrawer requests and only one batch is
+    held in memory at a time. Runs are only rendered when the caller gets to
+    them. When batch rendering is unavailable, slips are rendered one by one.
+    """
+    if get_pool() is None:
+        for slip, pdf_content in iter_rendered_slips(slips, generate_slip_pdf):
+            yield [slip], pdf_content, 0 if pdf_content else 1
+        return
+
+    max_run = settings.SLIP_DRAWER_POOL_SIZE * 2
+    run = []
+    for slip in slips:
+        pdf_content = get_cached_slip_pdf(slip)
+        if pdf_content is None:
+            run.append(slip)
+            if len(run) >= max_run:
+                yield from _render_run(run)
+                run = []
+            continue
+        if run:
+            yield from _render_run(run)
+            run = []
+        yield [slip], pdf_content, 0
+    if run:
+        yield from _render_run(run)
+
+
+def _render_run(run):
+    failures = []
+    try:
+        pdf_content = render_batch_pdf(run, on_progress=lambda done, failed: failures.append(failed))
+    except SlipRenderError as e:
+        print(f"Error generating PDF for slips {', '.join(slip.full_slip_number for slip in run)}: {e}")
+        yield run, None, len(run)
+        return
+
+    if pdf_content is not None:
+        yield run, pdf_content, failures[-1] if failures else 0
+        return
+
+    # The worker failed: render this run one slip at a time instead
+    for slip, pdf_content in iter_rendered_slips(run, generate_slip_pdf):
+        yield [slip], pdf_content, 0 if pdf_content else 1
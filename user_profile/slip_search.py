@@ -0,0 +1,103 @@
+# file: user_profile/slip_search.py
+import re
+import unicodedata
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Q, Sum
+
+from core.models import Slip, SlipSearchTerm
+
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+
+# How much a match counts towards a slip's rank, by the field the term comes from
+WEIGHT_NUMBER = 10
+WEIGHT_RECIPIENT = 5
+WEIGHT_DESCRIPTION = 3
+WEIGHT_LAVORAZIONE = 2
+WEIGHT_NOTES = 1
+
+
+def tokenize(text):
+    """
+    Splits text into lowercase, accent-free alphanumeric terms.
+    """
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return [term[:MAX_TERM_LENGTH] for term in re.findall(r"[a-z0-9]+", text)]
+
+
+def get_slip_terms(slip):
+    """
+    Returns the weighted terms of a slip: {term: weight}. A term found in
+    several fields adds up their weights. Line items are read from the
+    SlipItem rows, so prefetch them when indexing many slips.
+    """
+    terms = Counter()
+
+    def add(text, weight):
+        for term in set(tokenize(text)):
+            terms[term] += weight
+
+    add(slip.slip_number, WEIGHT_NUMBER)
+    add(slip.slip_year, WEIGHT_NOTES)
+    add(slip.recipient.company_name, WEIGHT_RECIPIENT)
+    add(slip.lavorazione, WEIGHT_LAVORAZIONE)
+    add(slip.notes, WEIGHT_NOTES)
+    for item in slip.slip_items.all():
+        add(item.description, WEIGHT_DESCRIPTION)
+        add(item.note, WEIGHT_NOTES)
+    return terms
+
+
+def index_slip(slip):
+    """
+    Replaces the indexed terms of a slip with its current ones.
+    """
+    terms = get_slip_terms(slip)
+    with transaction.atomic():
+        SlipSearchTerm.objects.filter(slip=slip).delete()
+        SlipSearchTerm.objects.bulk_create(
+            SlipSearchTerm(slip=slip, term=term, weight=min(weight, 32767))
+            for term, weight in terms.items()
+        )
+
+
+def get_query_terms(query):
+    return list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+
+
+def matching_slips(query, queryset=None):
+    """
+    Filters slips to those containing every term of the query. Query terms match
+    indexed terms by prefix, so "cardig" finds "cardigan".
+    """
+    queryset = Slip.objects.all() if queryset is None else queryset
+    terms = get_query_terms(query)
+    if not terms:
+        return queryset.none()
+    for term in terms:
+        queryset = queryset.filter(
+            pk__in=SlipSearchTerm.objects.filter(term__startswith=term).values("slip_id")
+        )
+    return queryset
+
+
+def search_slips(query, queryset=None):
+    """
+    Returns the slips matching query ranked by relevance: the sum of the weights
+    of the matched terms, with newer slips first among equal ranks.
+    """
+    terms = get_query_terms(query)
+    queryset = matching_slips(query, queryset)
+    if not terms:
+        return queryset
+    match = Q()
+    for term in terms:
+        match |= Q(search_terms__term__startswith=term)
+    return queryset.annotate(
+        search_rank=Sum("search_terms__weight", filter=match)
+    ).order_by("-search_rank", "-date", "-slip_number")
@@ -0,0 +1,85 @@
+# file: user_profile/summaries.py
+from calendar import monthrange
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum, Value
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear
+
+from core.models import MonthlySummary, Slip
+
+
+def get_summary_key(slip_date, recipient_id, lavorazione):
+    # Views assign the date straight from the form, so it may still be a string
+    slip_date = Slip._meta.get_field("date").to_python(slip_date)
+    return (slip_date.year, slip_date.month, recipient_id, lavorazione or "")
+
+
+def refresh_summary(key):
+    """
+    Recomputes one (year, month, recipient, lavorazione) row from its slips,
+    deleting it once no slip is left. Quantities are summed over the SlipItem
+    rows. Only that month's slips of that recipient are read, so this stays
+    cheap however many slips there are overall.
+    """
+    year, month, recipient_id, lavorazione = key
+    slips = Slip.objects.filter(
+        date__gte=date(year, month, 1),
+        date__lte=date(year, month, monthrange(year, month)[1]),
+        recipient_id=recipient_id,
+    )
+    if lavorazione:
+        slips = slips.filter(lavorazione=lavorazione)
+    else:
+        slips = slips.filter(Q(lavorazione="") | Q(lavorazione__isnull=True))
+    totals = slips.aggregate(
+        slip_count=Count("pk", distinct=True), total_quantity=Sum("slip_items__quantity")
+    )
+
+    with transaction.atomic():
+        if totals["slip_count"]:
+            MonthlySummary.objects.update_or_create(
+                year=year,
+                month=month,
+                recipient_id=recipient_id,
+                lavorazione=lavorazione,
+                defaults={
+                    "slip_count": totals["slip_count"],
+                    "total_quantity": totals["total_quantity"] or 0,
+                },
+            )
+        else:
+            MonthlySummary.objects.filter(
+                year=year, month=month, recipient_id=recipient_id, lavorazione=lavorazione
+            ).delete()
+
+
+def rebuild_summaries():
+    """
+    Recomputes the whole summary table with a single grouped query over the
+    slips and their SlipItem rows.
+    """
+    rows = (
+        Slip.objects.annotate(
+            year=ExtractYear("date"),
+            month=ExtractMonth("date"),
+            lavorazione_key=Coalesce("lavorazione", Value("")),
+        )
+        .values("year", "month", "recipient_id", "lavorazione_key")
+        .annotate(slip_count=Count("pk", distinct=True), quantity=Sum("slip_items__quantity"))
+        .order_by()
+    )
+    with transaction.atomic():
+        MonthlySummary.objects.all().delete()
+        MonthlySummary.objects.bulk_create(
+            MonthlySummary(
+                year=row["year"],
+                month=row["month"],
+                recipient_id=row["recipient_id"],
+                lavorazione=row["lavorazione_key"],
+                slip_count=row["slip_count"],
+                total_quantity=row["quantity"] or 0,
+            )
+            for row in rows
+        )
+    return MonthlySummary.objects.count()
@@ -1,3 +1,507 @@
-from django.test import TestCase
+import datetime
+import os
+import re
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PyPDF2 import PdfReader, PdfWriter
+
+from core.models import ItemSuggestion, MonthlySummary, PrintJob, Recipient, Slip, SlipNumberSequence
+from .item_suggestions import add_suggestion_uses, suggest_items
+from .pdf_stream import StreamingPdfWriter
+from .print_jobs import LeaseLost, claim_next_job, process_job, recover_stale_jobs, update_job
+from .recipient_duplicates import find_duplicate_groups, merge_recipients, pick_merge_target
+from .recipient_search import autocomplete_recipients
+from .slip_filters import paginate_slips
+from .slip_numbers import get_next_slip_number, get_number_gaps, reserve_slip_number
+from .slip_search import matching_slips, search_slips
+from .summaries import rebuild_summaries
+
+
+class SlipTestMixin:
+    def setUp(self):
+        self.user = User.objects.create_user('ufficio', password='pw')
+        self.recipient = Recipient.objects.create(
+            company_name='Maglificio Rossi', address_line1='Via Roma 1', city='Carpi', postal_code='41012'
+        )
+
+    def create_slip(self, number, year=2024, recipient=None, **kwargs):
+        kwargs.setdefault('date', datetime.date(year, 3, 1))
+        return Slip.objects.create(
+            slip_number=number,
+            slip_year=year,
+            recipient=recipient or self.recipient,
+            created_by=self.user,
+            **kwargs,
+        )
+
+    def reserve(self, year, number=None):
+        with transaction.atomic():
+            return reserve_slip_number(year, number)
+
+
+class SlipNumberTests(SlipTestMixin, TestCase):
+    def test_sequence_starts_after_existing_slips(self):
+        self.create_slip(7)
+        self.create_slip(3)
+        self.assertEqual(get_next_slip_number(2024), 8)
+        self.assertEqual(get_next_slip_number(2025), 1)
+
+    def test_reservations_are_consecutive(self):
+        self.assertEqual([self.reserve(2024) for _ in range(3)], [1, 2, 3])
+        self.assertEqual(SlipNumberSequence.objects.get(year=2024).next_number, 4)
+
+    def test_explicit_number_moves_the_sequence_past_it(self):
+        self.assertEqual(self.reserve(2024, 10), 10)
+        self.assertEqual(self.reserve(2024), 11)
+        # A lower explicit number is accepted without moving the sequence back
+        self.assertEqual(self.reserve(2024, 5), 5)
+        self.assertEqual(self.reserve(2024), 12)
+
+    def test_numbers_taken_outside_the_sequence_are_skipped(self):
+        self.assertEqual(self.reserve(2024), 1)
+        self.create_slip(2)
+        self.create_slip(3)
+        self.assertEqual(self.reserve(2024), 4)
+
+    def test_rolled_back_reservation_gives_its_number_back(self):
+        self.reserve(2024)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                reserve_slip_number(2024)
+                raise RuntimeError
+        self.assertEqual(self.reserve(2024), 2)
+
+    def test_gaps_list_numbers_without_a_slip(self):
+        self.assertEqual(get_number_gaps(2024), [])
+        for _ in range(5):
+            self.create_slip(self.reserve(2024))
+        Slip.objects.get(slip_number=2, slip_year=2024).delete()
+        Slip.objects.get(slip_number=4, slip_year=2024).delete()
+        self.assertEqual(get_number_gaps(2024), [2, 4])
+
+    def test_create_view_takes_the_next_free_number_when_the_suggestion_was_used(self):
+        self.client.force_login(self.user)
+        self.reserve(2024)
+        # Someone else registered the suggested number in the meantime
+        self.create_slip(2)
+        response = self.client.post(reverse('create_slip'), {
+            'slip_number': '2',
+            'slip_year': '2024',
+            'suggested_slip_number': '2-2024',
+            'date': '2024-03-02',
+            'recipient': self.recipient.pk,
+            'items': '[]',
+        })
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        self.assertTrue(Slip.objects.filter(slip_number=3, slip_year=2024).exists())
+        self.assertEqual(get_number_gaps(2024), [1])
+
+
+class RecipientMergeTests(SlipTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.recipient.vat_number = '01234567890'
+        self.recipient.save()
+        # Same VAT number under another name
+        self.duplicate = Recipient.objects.create(
+            company_name='Rossi Maglieria', address_line1='Via Roma 1', city='Carpi',
+            postal_code='41012', phone='059 123456', vat_number='IT 01234567890',
+        )
+        self.other = Recipient.objects.create(
+            company_name='Tessitura Bianchi', address_line1='Via Po 3', city='Prato', postal_code='59100'
+        )
+        item = {'description': 'Cardigan', 'quantity': '2', 'unit': 'pz', 'note': ''}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_slip(1, lavorazione='Taglio', items=[item])
+            self.create_slip(2, recipient=self.duplicate, lavorazione='Taglio', items=[item])
+            self.create_slip(3, recipient=self.duplicate, lavorazione='Cucito', items=[item])
+
+    def test_duplicates_are_grouped(self):
+        self.assertEqual(find_duplicate_groups(), [[self.recipient.pk, self.duplicate.pk]])
+
+    def test_same_name_alone_is_not_a_duplicate(self):
+        # Same name, but in another town
+        Recipient.objects.create(
+            company_name='Maglificio Rossi S.r.l.', address_line1='Via Dante 9', city='Biella', postal_code='13900'
+        )
+        # Same name and town, but a different firm
+        other_firm = Recipient.objects.create(
+            company_name='Maglificio Rossi', address_line1='Via Roma 80', city='Carpi',
+            postal_code='41012', vat_number='09876543210',
+        )
+        same_town = Recipient.objects.create(
+            company_name='Maglificio Rossi srl', address_line1='Via Roma 1', city='Carpi', postal_code='41012'
+        )
+
+        groups = find_duplicate_groups()
+
+        self.assertEqual(groups, [[self.recipient.pk, self.duplicate.pk, same_town.pk]])
+        self.assertNotIn(other_firm.pk, groups[0])
+
+    def test_target_is_the_recipient_with_most_slips(self):
+        target = pick_merge_target([self.recipient.pk, self.duplicate.pk])
+        self.assertEqual(target, self.duplicate)
+
+    def test_merge_moves_slips_and_deletes_duplicates(self):
+        moved = merge_recipients(self.recipient, [self.duplicate])
+
+        self.assertEqual(moved, 2)
+        self.assertFalse(Recipient.objects.filter(pk=self.duplicate.pk).exists())
+        self.assertEqual(self.recipient.slips.count(), 3)
+        self.recipient.refresh_from_db()
+        # Empty fields are filled in from the duplicate
+        self.assertEqual(self.recipient.phone, '059 123456')
+        self.assertEqual(self.recipient.vat_number, '01234567890')
+
+    def test_merge_refreshes_derived_data(self):
+        merge_recipients(self.recipient, [self.duplicate])
+
+        summaries = MonthlySummary.objects.filter(recipient=self.recipient)
+        self.assertEqual(
+            sorted(summaries.values_list('lavorazione', 'slip_count', 'total_quantity')),
+            [('Cucito', 1, 2.0), ('Taglio', 2, 4.0)],
+        )
+        suggestion = ItemSuggestion.objects.get(recipient=self.recipient, key='cardigan')
+        self.assertEqual(suggestion.use_count, 3)
+        # The moved slips are indexed under their new recipient's name
+        self.assertEqual(matching_slips('maglificio').count(), 3)
+        self.assertFalse(matching_slips('maglieria').exists())
+
+    def test_merge_leaves_other_recipients_alone(self):
+        self.assertEqual(merge_recipients(self.recipient, [self.recipient]), 0)
+        merge_recipients(self.recipient, [self.duplicate])
+        self.assertTrue(Recipient.objects.filter(pk=self.other.pk).exists())
+
+
+class SlipPaginationTests(SlipTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        same_day = datetime.date(2024, 5, 10)
+        # Same date throughout, and the same number in two years, so only the pk breaks the tie
+        for number, year in [(1, 2023), (1, 2024), (2, 2023), (2, 2024), (3, 2024)]:
+            self.create_slip(number, year, date=same_day)
+        self.create_slip(9, 2024, date=datetime.date(2024, 5, 11))
+        self.create_slip(8, 2024, date=datetime.date(2024, 5, 9))
+
+    def numbers(self, page):
+        return [slip.full_slip_number for slip in page["slips"]]
+
+    def test_paging_forward_then_back_returns_the_same_pages(self):
+        queryset = Slip.objects.all()
+        forward = [paginate_slips(queryset, per_page=2)]
+        while forward[-1]["older_cursor"]:
+            forward.append(paginate_slips(queryset, after=forward[-1]["older_cursor"], per_page=2))
+
+        expected = [slip.full_slip_number for slip in queryset.order_by("-date", "-slip_number", "-pk")]
+        self.assertEqual(sum((self.numbers(page) for page in forward), []), expected)
+
+        backward = [forward[-1]]
+        while backward[-1]["newer_cursor"]:
+            backward.append(paginate_slips(queryset, before=backward[-1]["newer_cursor"], per_page=2))
+
+        self.assertEqual([self.numbers(page) for page in reversed(backward)], [self.numbers(page) for page in forward])
+        self.assertIsNone(backward[-1]["newer_cursor"])
+
+
+class SlipSearchTests(SlipTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        item = {'description': 'Cardigan', 'quantity': '2', 'unit': 'pz', 'note': ''}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.slip = self.create_slip(1, lavorazione='Taglio', items=[item])
+
+    def test_prefix_matches_indexed_terms(self):
+        self.assertEqual(list(matching_slips('cardig')), [self.slip])
+        self.assertEqual(list(search_slips('maglif tagl')), [self.slip])
+        self.assertFalse(matching_slips('maglione').exists())
+
+    def test_renamed_recipient_is_found_by_its_new_name(self):
+        self.recipient.company_name = 'Tessitura Verdi'
+        self.recipient.save()
+
+        self.assertEqual(list(matching_slips('tessit')), [self.slip])
+        self.assertEqual(list(search_slips('verd cardig')), [self.slip])
+        self.assertFalse(matching_slips('maglif').exists())
+
+    def test_other_recipient_edits_keep_the_index(self):
+        self.recipient.city = 'Modena'
+        with CaptureQueriesContext(connection) as queries:
+            self.recipient.save()
+
+        self.assertFalse([query for query in queries if 'slipsearchterm' in query['sql']])
+        self.assertEqual(list(matching_slips('maglif')), [self.slip])
+
+
+class MonthlySummaryTests(SlipTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first = self.create_slip(1, lavorazione='Taglio', items=[
+                {'description': 'Cardigan', 'quantity': '2', 'unit': 'pz', 'note': ''},
+                {'description': 'Gonna', 'quantity': '3', 'unit': 'pz', 'note': ''},
+            ])
+            self.second = self.create_slip(2, lavorazione='Taglio', items=[
+                {'description': 'Cardigan', 'quantity': '4', 'unit': 'pz', 'note': ''},
+            ])
+
+    def summaries(self):
+        return sorted(MonthlySummary.objects.values_list('year', 'month', 'lavorazione', 'slip_count', 'total_quantity'))
+
+    def test_totals_follow_a_slip_to_another_month(self):
+        self.assertEqual(self.summaries(), [(2024, 3, 'Taglio', 2, 9.0)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            # Views assign the date as the form's string
+            self.second.date = '2024-04-15'
+            self.second.save()
+
+        self.assertEqual(self.summaries(), [(2024, 3, 'Taglio', 1, 5.0), (2024, 4, 'Taglio', 1, 4.0)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first.date = datetime.date(2024, 4, 2)
+            self.first.save()
+
+        # The emptied month is removed rather than left at zero
+        self.assertEqual(self.summaries(), [(2024, 4, 'Taglio', 2, 9.0)])
+
+    def test_incremental_totals_match_a_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.second.date = datetime.date(2024, 5, 1)
+            self.second.lavorazione = 'Ricamo/Applicazione'
+            self.second.save()
+            self.first.delete()
+        incremental = self.summaries()
+
+        rebuild_summaries()
+
+        self.assertEqual(self.summaries(), incremental)
+        self.assertEqual(incremental, [(2024, 5, 'Ricamo/Applicazione', 1, 4.0)])
+
+
+class RecipientAutocompleteTests(SlipTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.carpi_moda = Recipient.objects.create(
+            company_name='Carpi Moda', address_line1='Via Po 3', city='Modena', postal_code='41121'
+        )
+        self.vat = Recipient.objects.create(
+            company_name='Tessitura Bianchi', address_line1='Via Po 3', city='Prato',
+            postal_code='59100', vat_number='CARPI123',
+        )
+        self.typo = Recipient.objects.create(
+            company_name='Maglificio Rosi', address_line1='Via Po 3', city='Prato', postal_code='59100'
+        )
+        Recipient.objects.filter(pk=self.vat.pk).update(last_used_at=timezone.now())
+
+    def test_prefix_of_any_field_matches_most_recently_used_first(self):
+        self.assertEqual(
+            autocomplete_recipients('carp'), [self.vat, self.carpi_moda, self.recipient]
+        )
+
+    def test_limit_applies_across_fields(self):
+        self.assertEqual(autocomplete_recipients('carp', limit=2), [self.vat, self.carpi_moda])
+
+    def test_fuzzy_matches_fill_up_the_list(self):
+        results = autocomplete_recipients('maglificio ross')
+        self.assertEqual(results[0], self.recipient)
+        self.assertIn(self.typo, results)
+
+
+class ItemSuggestionTests(SlipTestMixin, TestCase):
+    def test_overall_and_recipient_counts_are_kept_apart(self):
+        item = {'description': 'Cardigan', 'quantity': '2', 'unit': 'pz', 'note': ''}
+        other = Recipient.objects.create(
+            company_name='Tessitura Bianchi', address_line1='Via Po 3', city='Prato', postal_code='59100'
+        )
+        self.create_slip(1, items=[item])
+        self.create_slip(2, recipient=other, items=[item, {**item, 'description': 'Gonna', 'unit': 'kg'}])
+
+        self.assertEqual(
+            sorted(ItemSuggestion.objects.values_list('scope', 'key', 'use_count')),
+            [(0, 'cardigan', 2), (0, 'gonna', 1), (self.recipient.pk, 'cardigan', 1),
+             (other.pk, 'cardigan', 1), (other.pk, 'gonna', 1)],
+        )
+        self.assertEqual(
+            [(suggestion['description'], suggestion['recipient_uses']) for suggestion in suggest_items('', other.pk)],
+            [('Cardigan', 1), ('Gonna', 1)],
+        )
+        self.assertEqual([suggestion['description'] for suggestion in suggest_items('gon')], ['Gonna'])
+
+    def test_overall_key_is_unique(self):
+        add_suggestion_uses(None, 'cardigan', 1, 'Cardigan', 'pz')
+        add_suggestion_uses(None, 'cardigan', 2, 'cardigan', '')
+
+        suggestion = ItemSuggestion.objects.get(scope=0, key='cardigan')
+        self.assertEqual((suggestion.use_count, suggestion.description, suggestion.unit), (3, 'cardigan', 'pz'))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ItemSuggestion.objects.create(key='cardigan', description='Cardigan')
+
+
+def make_pdf(*page_widths):
+    writer = PdfWriter()
+    for width in page_widths:
+        writer.add_blank_page(width=width, height=842)
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+class StreamingPdfWriterTests(SimpleTestCase):
+    def merge(self, *documents):
+        writer = StreamingPdfWriter()
+        chunks = [writer.start()]
+        for document in documents:
+            try:
+                chunks.append(writer.add_document(document))
+            except Exception:
+                pass
+        chunks.append(writer.finish())
+        return b"".join(chunks)
+
+    def assertXrefOffsetsMatch(self, output):
+        xref_offset = int(re.search(rb"startxref\n(\d+)", output).group(1))
+        self.assertTrue(output[xref_offset:].startswith(b"xref\n"))
+        entries = re.findall(rb"(\d{10}) 00000 n ", output[xref_offset:])
+        self.assertTrue(entries)
+        for number, offset in enumerate(entries, start=1):
+            self.assertTrue(
+                output[int(offset):].startswith(f"{number} 0 obj".encode()),
+                f"xref entry of object {number} points to the wrong offset",
+            )
+
+    def page_widths(self, output):
+        return [float(page.mediabox.width) for page in PdfReader(BytesIO(output), strict=True).pages]
+
+    def test_pages_are_concatenated_in_order(self):
+        output = self.merge(make_pdf(500, 510), make_pdf(520))
+
+        self.assertEqual(self.page_widths(output), [500, 510, 520])
+        self.assertXrefOffsetsMatch(output)
+
+    def test_document_failing_halfway_is_rolled_back(self):
+        writer = StreamingPdfWriter()
+        chunks = [writer.start(), writer.add_document(make_pdf(500))]
+        # The pages are allocated before their objects are serialized
+        with mock.patch.object(writer, "_remap", side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                writer.add_document(make_pdf(510, 515))
+        chunks += [writer.add_document(make_pdf(520)), writer.finish()]
+        output = b"".join(chunks)
+
+        self.assertEqual(self.page_widths(output), [500, 520])
+        self.assertXrefOffsetsMatch(output)
+
+    def test_unreadable_document_is_skipped(self):
+        output = self.merge(make_pdf(500), b"%PDF-1.7 not really a pdf", make_pdf(520))
+
+        self.assertEqual(self.page_widths(output), [500, 520])
+        self.assertXrefOffsetsMatch(output)
+
+
+class PrintJobTests(SlipTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.job_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.job_dir, ignore_errors=True)
+        settings_override = override_settings(PRINT_JOB_DIR=self.job_dir, SLIP_DRAWER_POOL_SIZE=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.slips = [self.create_slip(number) for number in range(1, 10)]
+        self.job = PrintJob.objects.create(
+            slip_ids=[slip.pk for slip in self.slips], total=len(self.slips), created_by=self.user
+        )
+
+    def render_batch(self, slips, on_progress=None):
+        return make_pdf(*(500 + slip.slip_number for slip in slips))
+
+    def test_slips_are_rendered_in_bounded_batches(self):
+        with mock.patch("user_profile.slip_pdf.get_pool", return_value=object()), \
+                mock.patch("user_profile.slip_pdf.get_cached_slip_pdf", return_value=None), \
+                mock.patch("user_profile.slip_pdf.render_batch_pdf", side_effect=self.render_batch) as render:
+            process_job(claim_next_job())
+
+        self.assertEqual([len(call.args[0]) for call in render.call_args_list], [4, 4, 1])
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, PrintJob.STATUS_DONE)
+        self.assertEqual((self.job.processed, self.job.failed), (9, 0))
+        with open(self.job.file_path, "rb") as f:
+            pages = PdfReader(f).pages
+            self.assertEqual([float(page.mediabox.width) for page in pages], list(range(501, 510)))
+
+    def test_cached_slips_are_not_rendered_again(self):
+        cached = {self.slips[4].pk: make_pdf(505)}
+        with mock.patch("user_profile.slip_pdf.get_pool", return_value=object()), \
+                mock.patch("user_profile.slip_pdf.get_cached_slip_pdf", side_effect=lambda slip: cached.get(slip.pk)), \
+                mock.patch("user_profile.slip_pdf.render_batch_pdf", side_effect=self.render_batch) as render:
+            process_job(claim_next_job())
+
+        self.assertEqual(
+            [[slip.slip_number for slip in call.args[0]] for call in render.call_args_list],
+            [[1, 2, 3, 4], [6, 7, 8, 9]],
+        )
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.processed), (PrintJob.STATUS_DONE, 9))
+
+    def test_claimed_job_gets_a_lease_and_heartbeat(self):
+        job = claim_next_job()
+
+        self.assertEqual(job.pk, self.job.pk)
+        self.assertEqual(job.status, PrintJob.STATUS_RUNNING)
+        self.assertTrue(job.lease)
+        self.assertIsNotNone(job.heartbeat)
+        self.assertIsNone(claim_next_job())
+
+    def test_progress_moves_the_heartbeat(self):
+        job = claim_next_job()
+        PrintJob.objects.filter(pk=job.pk).update(heartbeat=timezone.now() - datetime.timedelta(minutes=10))
+
+        update_job(job, processed=3)
+
+        job.refresh_from_db()
+        self.assertEqual(job.processed, 3)
+        self.assertGreater(job.heartbeat, timezone.now() - datetime.timedelta(minutes=1))
+
+    @override_settings(PRINT_JOB_STALE_AFTER=300)
+    def test_stale_job_is_requeued_and_the_old_runner_loses_it(self):
+        old = claim_next_job()
+        PrintJob.objects.filter(pk=old.pk).update(heartbeat=timezone.now() - datetime.timedelta(minutes=10))
+
+        self.assertEqual(recover_stale_jobs(), 1)
+        new = claim_next_job()
+
+        self.assertNotEqual(new.lease, old.lease)
+        with self.assertRaises(LeaseLost):
+            update_job(old, processed=5)
+        new.refresh_from_db()
+        self.assertEqual(new.processed, 0)
+
+    def test_fresh_job_is_not_requeued(self):
+        claim_next_job()
+        self.assertEqual(recover_stale_jobs(), 0)
+
+    def test_runner_that_lost_its_lease_leaves_the_job_alone(self):
+        job = claim_next_job()
+
+        def take_over(slips, on_progress=None):
+            PrintJob.objects.filter(pk=job.pk).update(lease="someoneelse")
+            return self.render_batch(slips)
+
+        with mock.patch("user_profile.slip_pdf.get_pool", return_value=object()), \
+                mock.patch("user_profile.slip_pdf.get_cached_slip_pdf", return_value=None), \
+                mock.patch("user_profile.slip_pdf.render_batch_pdf", side_effect=take_over):
+            process_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.lease), (PrintJob.STATUS_RUNNING, "someoneelse"))
+        self.assertIsNone(job.file_path)
+        self.assertEqual(os.listdir(self.job_dir), [])
@@ -8,9 +8,17 @@ urlpatterns = [
     path('slips/<int:pk>/edit/', views.edit_slip_view, name='edit_slip'),
     path('slips/<int:pk>/delete/', views.delete_slip_view, name='delete_slip'),
     path('slips/<int:pk>/download/', views.download_slip_view, name='download_slip'),
+    path('slips/search/', views.slip_search_view, name='slip_search'),
+    path('slips/item-suggestions/', views.item_suggestions_view, name='item_suggestions'),
+    path('slips/pdf-stats/', views.slip_pdf_stats_view, name='slip_pdf_stats'),
+    path('reports/number-gaps/', views.number_gaps_view, name='number_gaps'),
+    path('reports/monthly/', views.monthly_report_view, name='monthly_report'),
     path('recipients/', views.recipient_list_view, name='recipient_list'),
+    path('recipients/autocomplete/', views.recipient_autocomplete_view, name='recipient_autocomplete'),
     path('recipients/add/', views.add_recipient_view, name='add_recipient'),
     path('recipients/<int:pk>/edit/', views.edit_recipient_view, name='edit_recipient'),
     path('recipients/<int:pk>/delete/', views.delete_recipient_view, name='delete_recipient'),
     path('custom-print/', views.custom_print_view, name='custom_print'),
+    path('custom-print/jobs/<int:pk>/', views.print_job_status_view, name='print_job_status'),
+    path('custom-print/jobs/<int:pk>/download/', views.print_job_download_view, name='print_job_download'),
 ]   
\ No newline at end of file
@@ -1,155 +1,64 @@
 # file: user_profile/views.py
-from django.db import models
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from core.models import Slip, Recipient
+from core.models import Slip, Recipient, PrintJob, MonthlySummary, SlipNumberSequence
 import json
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from datetime import date
-from django.db import IntegrityError
-from django.db.models import Max, Q
+from django.db import IntegrityError, transaction
+from django.db.models import Sum
 from django.conf import settings
-import subprocess
-import tempfile
+from django.urls import reverse
+from django.core.paginator import Paginator
 import os
-from io import BytesIO
-from PyPDF2 import PdfMerger
-import concurrent.futures
-
-def generate_slip_pdf(slip):
+from .slip_pdf import (
+    SlipRenderError,
+    iter_slip_documents,
+    render_slip_pdf,
+)
+from .pdf_stream import StreamingPdfWriter
+from .responses import ranged_file_response, streaming_response
+from .print_jobs import ensure_runner, submit_print_job
+from .pdf_cache import get_pdf_cache
+from .render_limits import get_render_gate, in_flight_renders
+from .slip_filters import (
+    DASHBOARD_FIELDS,
+    LAVORAZIONI,
+    filter_slips,
+    get_slip_filters,
+    paginate_slips,
+)
+from .slip_search import search_slips
+from .recipient_search import (
+    AUTOCOMPLETE_LIMIT,
+    RECIPIENTS_PER_PAGE,
+    autocomplete_recipients,
+    search_recipients,
+)
+from .item_suggestions import SUGGESTION_LIMIT, suggest_items
+from .slip_numbers import get_next_slip_number, get_number_gaps, reserve_slip_number
+
+def stream_merged_slips(writer, first_chunk, documents):
     """
-    Generates a PDF for a given slip and returns the file path.
-    Returns None if generation fails.
+    Yields the merged PDF of the remaining slips as each document becomes available.
+    Failures can no longer be reported to the user at this point, so they are logged
+    and the slips are left out of the document.
     """
-    import json
-    import subprocess
-    import tempfile
-    import os
-    from django.conf import settings
-    
-    # Prepare data for JSON
-    items = slip.items or []
-    descrizioni = [item.get("description", "") for item in items]
-    qta = [str(item.get("quantity", "")) for item in items]
-    um = [item.get("unit", "") for item in items]
-    item_notes = [item.get("note", "---") for item in items]
-
-    recipient_data = {
-        "usr": slip.recipient.company_name,
-        "riga1": slip.recipient.address_line1,
-        "riga2": slip.recipient.address_line2 or "",
-        "citta": slip.recipient.city,
-        "prov": slip.recipient.province_sigla or "",
-        "cap": slip.recipient.postal_code,
-        "paese": slip.recipient.country,
-    }
-
-    same_address = not slip.different_address
-    dst2_data = []
-    if not same_address:
-        addr = slip.different_address
-        dst2_data = [
-            addr.get("dest_name", ""),
-            addr.get("dest_address", ""),
-            addr.get("dest_city", ""),
-            addr.get("dest_cap", ""),
-            addr.get("dest_state", ""),
-        ]
-
-    bolla_data = {
-        "data": slip.date.strftime("%d/%m/%Y"),
-        "descrizioni": descrizioni,
-        "qta": qta,
-        "um": um,
-        "note": item_notes,
-        "lavorazione": slip.lavorazione or "",
-        "respSpedizione": slip.resp_spedizione or "",
-        "dataTrasp": slip.data_trasp.strftime("%d/%m/%Y") if slip.data_trasp else "",
-        "aspetto": slip.aspetto or "",
-        "dst": recipient_data,
-        "sameAddress": same_address,
-        "dst2": dst2_data,
-        "number": str(slip.slip_number),
-        "year": str(slip.slip_year),
-    }
-
-    json_string = json.dumps(bolla_data)
-
-    jar_path = os.path.join(
-        settings.BASE_DIR,
-        "core",
-        "static",
-        "programs",
-        "SlipDrawer",
-        "BollaDrawer-1.0-SNAPSHOT.jar",
-    )
-    static_files_path = os.path.join(settings.BASE_DIR, "core", "static")
-
-    with tempfile.TemporaryDirectory() as temp_dir:
-        command = ["java", "-jar", jar_path, json_string, temp_dir, static_files_path]
-
+    yield first_chunk
+    for slips, pdf_content, failed in documents:
+        numbers = ", ".join(slip.full_slip_number for slip in slips)
+        if failed:
+            print(f"Failed to generate PDF for {failed} of slips {numbers}")
+        if not pdf_content:
+            continue
         try:
-            result = subprocess.run(command, check=True, capture_output=True, text=True)
-        except subprocess.CalledProcessError as e:
-            print(f"Error generating PDF for slip {slip.full_slip_number}: {e.stderr}")
-            return None
-
-        # Log stdout/stderr for debugging
-        if result.stdout:
-            print(result.stdout)
-        if result.stderr:
-            print(result.stderr)
-
-        # Search for the generated PDF
-        found_pdf = None
-
-        # Prepare candidate filenames to match (handle variants like '/' vs '-')
-        normalized_full = str(slip.full_slip_number).replace("/", "-")
-        candidates = {
-            f"{slip.full_slip_number}.pdf",
-            f"{normalized_full}.pdf",
-            f"{slip.slip_number}-{slip.slip_year}.pdf",
-            f"{slip.slip_number}_{slip.slip_year}.pdf",
-            f"{slip.slip_number}.{slip.slip_year}.pdf",
-        }
-
-        for root, dirs, files in os.walk(temp_dir):
-            for fname in files:
-                if not fname.lower().endswith(".pdf"):
-                    continue
-                full_path = os.path.join(root, fname)
-                # Exact candidate match or contains both number and year
-                if fname in candidates or (
-                    str(slip.slip_number) in fname and str(slip.slip_year) in fname
-                ):
-                    found_pdf = full_path
-                    break
-            if found_pdf:
-                break
+            yield writer.add_document(pdf_content)
+            print(f"Successfully added PDF for slips {numbers}")
+        except Exception as e:
+            print(f"Error adding PDF for slips {numbers}: {e}")
+    yield writer.finish()
 
-        if found_pdf and os.path.exists(found_pdf):
-            # Read the PDF content and return it as bytes
-            with open(found_pdf, "rb") as f:
-                pdf_content = f.read()
-            return pdf_content
-        else:
-            # Collect generated PDFs (if any) for diagnostics
-            generated_pdfs = []
-            for root, dirs, files in os.walk(temp_dir):
-                for fname in files:
-                    if fname.lower().endswith(".pdf"):
-                        generated_pdfs.append(os.path.join(root, fname))
-
-            print(f"PDF not found for slip {slip.full_slip_number}")
-            if result.stdout:
-                print(f"Stdout: {result.stdout}")
-            if result.stderr:
-                print(f"Stderr: {result.stderr}")
-            if generated_pdfs:
-                print(f"Generated PDFs found: {generated_pdfs}")
-
-            return None
 
 @login_required
 def profile_view(request):
@@ -165,13 +74,28 @@ def dashboard_view(request):
     """
     Displays a dashboard of delivery/shipping slips for the logged-in user.
     """
-    slips = Slip.objects.all().order_by(
-        "-date", "-slip_number"
+    filters = get_slip_filters(request.GET)
+    slips = filter_slips(
+        Slip.objects.select_related("recipient").only(*DASHBOARD_FIELDS), filters
     )
+    page = paginate_slips(
+        slips, after=request.GET.get("after"), before=request.GET.get("before")
+    )
+
+    # Filters are carried over to the pagination links
+    filter_query = request.GET.copy()
+    for key in ("after", "before"):
+        filter_query.pop(key, None)
 
     context = {
         "page_title": "Dashboard Bolle",
-        "slips": slips,
+        "slips": page["slips"],
+        "newer_cursor": page["newer_cursor"],
+        "older_cursor": page["older_cursor"],
+        "filters": filters,
+        "filter_query": filter_query.urlencode(),
+        "selected_recipient": get_selected_recipient(filters.get("recipient")),
+        "lavorazioni": LAVORAZIONI,
     }
     return render(request, "user_profile/dashboard.html", context)
 
@@ -181,21 +105,8 @@ def create_slip_view(request):
     """
     Handles the creation of a new delivery slip.
     """
-    recipients = Recipient.objects.all()
     current_year = date.today().year
 
-    # Logic to get the next available slip number
-    # Find the last slip number for the current year
-    last_slip = Slip.objects.filter(slip_year=current_year).aggregate(
-        models.Max("slip_number")
-    )
-    # Assuming slip_number is an integer, get the next one.
-    # If no slips exist for the current year, start from 1.
-    if last_slip["slip_number__max"]:
-        next_slip_number = int(last_slip["slip_number__max"]) + 1
-    else:
-        next_slip_number = 1
-
     if request.method == "POST":
         print(request.POST)
         slip_number = int(request.POST.get("slip_number"))
@@ -229,24 +140,38 @@ def create_slip_view(request):
             messages.error(request, f"Errore nel formato JSON degli articoli: {e}")
             return redirect("create_slip")
 
+        # A number left as pre-filled is reserved from the sequence, so that two
+        # people creating a slip at the same time don't end up with the same one
+        suggested = request.POST.get("suggested_slip_number")
+        auto_number = suggested == f"{slip_number}-{slip_year}"
+
         try:
             recipient = get_object_or_404(
                 Recipient, id=recipient_id
             )
-            Slip.objects.create(
-                slip_number=slip_number,
-                slip_year=int(slip_year),
-                date=slip_date,
-                recipient=recipient,
-                created_by=request.user,
-                lavorazione=lavorazione,
-                resp_spedizione=resp_spedizione,
-                data_trasp=data_trasp if data_trasp else None,
-                aspetto=aspetto,
-                items=items,
-                notes=notes,
-                different_address=different_address,
-            )
+            with transaction.atomic():
+                slip_number = reserve_slip_number(
+                    slip_year, None if auto_number else slip_number
+                )
+                Slip.objects.create(
+                    slip_number=slip_number,
+                    slip_year=int(slip_year),
+                    date=slip_date,
+                    recipient=recipient,
+                    created_by=request.user,
+                    lavorazione=lavorazione,
+                    resp_spedizione=resp_spedizione,
+                    data_trasp=data_trasp if data_trasp else None,
+                    aspetto=aspetto,
+                    items=items,
+                    notes=notes,
+                    different_address=different_address,
+                )
+            if auto_number and suggested != f"{slip_number}-{slip_year}":
+                messages.warning(
+                    request,
+                    f"Il numero proposto era già stato usato: la bolla è stata registrata come {slip_number}-{slip_year}.",
+                )
             messages.success(request, "Bolla creata con successo!")
             return redirect("dashboard")
         except IntegrityError:
@@ -257,12 +182,13 @@ def create_slip_view(request):
         except Exception as e:
             messages.error(request, f"Errore nella creazione della bolla: {e}")
 
-    print(next_slip_number)
+    next_slip_number = get_next_slip_number(current_year)
     context = {
         "page_title": "Crea Nuova Bolla",
-        "recipients": recipients,
+        "has_recipients": Recipient.objects.exists(),
         "current_year": current_year,
         "next_slip_number": next_slip_number,  # Pass the new number to the template
+        "suggested_slip_number": f"{next_slip_number}-{current_year}",
         "form_data": {
             "date": date.today().strftime("%Y-%m-%d"),
             "data_trasp": date.today().strftime("%Y-%m-%d"),
@@ -276,8 +202,7 @@ def create_slip_view(request):
 
 @login_required
 def edit_slip_view(request, pk):
-    slip = get_object_or_404(Slip, pk=pk)
-    recipients = Recipient.objects.all()
+    slip = get_object_or_404(Slip.objects.select_related("recipient"), pk=pk)
 
     if request.method == "POST":
         slip.slip_number = request.POST.get("slip_number")
@@ -346,7 +271,8 @@ def edit_slip_view(request, pk):
         "page_title": "Modifica Bolla",
         "slip": slip,
         "next_slip_number": slip.slip_number,
-        "recipients": recipients,
+        "selected_recipient": slip.recipient,
+        "has_recipients": True,
         "form_data": form_data,
         "is_edit": True,
     }
@@ -366,161 +292,202 @@ def delete_slip_view(request, pk):
 def download_slip_view(request, pk):
     slip = get_object_or_404(Slip, pk=pk)
 
-    # Prepare data for JSON
-    items = slip.items or []
-    descrizioni = [item.get("description", "") for item in items]
-    qta = [str(item.get("quantity", "")) for item in items]
-    um = [item.get("unit", "") for item in items]
-    item_notes = [item.get("note", "---") for item in items]
-
-    recipient_data = {
-        "usr": slip.recipient.company_name,
-        "riga1": slip.recipient.address_line1,
-        "riga2": slip.recipient.address_line2 or "",
-        "citta": slip.recipient.city,
-        "prov": slip.recipient.province_sigla or "",
-        "cap": slip.recipient.postal_code,
-        "paese": slip.recipient.country,
-    }
+    try:
+        pdf_content = render_slip_pdf(slip)
+    except SlipRenderError as e:
+        messages.error(request, str(e))
+        return redirect("dashboard")
+
+    disposition = "inline" if request.GET.get("view") else "attachment"
+    # Use a safe filename for Content-Disposition
+    safe_name = f"{str(slip.full_slip_number).replace('/', '-')}.pdf"
+    response = HttpResponse(pdf_content, content_type="application/pdf")
+    response["Content-Disposition"] = f'{disposition}; filename="{safe_name}"'
+    return response
+
 
-    same_address = not slip.different_address
-    dst2_data = []
-    if not same_address:
-        addr = slip.different_address
-        dst2_data = [
-            addr.get("dest_name", ""),
-            addr.get("dest_address", ""),
-            addr.get("dest_city", ""),
-            addr.get("dest_cap", ""),
-            addr.get("dest_state", ""),
+@login_required
+def slip_pdf_stats_view(request):
+    """
+    Returns the slip PDF cache counters and disk usage, and the render queue
+    depth and wait times. Counters are per server process.
+    """
+    return JsonResponse({
+        "cache": get_pdf_cache().stats(),
+        "render": {**get_render_gate().stats(), **in_flight_renders.stats()},
+    })
+
+
+@login_required
+def slip_search_view(request):
+    """
+    Returns the slips best matching the "q" parameter, ranked by relevance.
+    Searches slip number, recipient, lavorazione, notes and item descriptions and notes.
+    """
+    try:
+        limit = min(max(int(request.GET.get("limit", 20)), 1), 50)
+    except ValueError:
+        limit = 20
+    slips = search_slips(
+        request.GET.get("q", ""),
+        Slip.objects.select_related("recipient").only(*DASHBOARD_FIELDS),
+    )[:limit]
+    return JsonResponse({
+        "results": [
+            {
+                "id": slip.pk,
+                "full_slip_number": slip.full_slip_number,
+                "date": slip.date.strftime("%d/%m/%Y"),
+                "recipient": slip.recipient.company_name,
+                "lavorazione": slip.lavorazione,
+                "total_quantity": slip.total_quantity,
+                "rank": slip.search_rank,
+                "edit_url": reverse("edit_slip", args=[slip.pk]),
+                "download_url": reverse("download_slip", args=[slip.pk]),
+            }
+            for slip in slips
         ]
+    })
+
 
-    bolla_data = {
-        "data": slip.date.strftime("%d/%m/%Y"),
-        "descrizioni": descrizioni,
-        "qta": qta,
-        "um": um,
-        "note": item_notes,
-        "lavorazione": slip.lavorazione or "",
-        "respSpedizione": slip.resp_spedizione or "",
-        "dataTrasp": slip.data_trasp.strftime("%d/%m/%Y") if slip.data_trasp else "",
-        "aspetto": slip.aspetto or "",
-        "dst": recipient_data,
-        "sameAddress": same_address,
-        "dst2": dst2_data,
-        "number": str(slip.slip_number),
-        "year": str(slip.slip_year),
+@login_required
+def number_gaps_view(request):
+    """
+    Lists the slip numbers of a year that were handed out but are not used by any slip.
+    """
+    years = list(SlipNumberSequence.objects.values_list("year", flat=True))
+    year = get_slip_filters(request.GET).get("year") or date.today().year
+    context = {
+        "page_title": "Numeri Bolla Mancanti",
+        "year": year,
+        "years": years,
+        "gaps": get_number_gaps(year),
+        "next_slip_number": SlipNumberSequence.objects.filter(year=year)
+        .values_list("next_number", flat=True)
+        .first(),
     }
+    return render(request, "user_profile/number_gaps.html", context)
 
-    json_string = json.dumps(bolla_data)
 
-    jar_path = os.path.join(
-        settings.BASE_DIR,
-        "core",
-        "static",
-        "programs",
-        "SlipDrawer",
-        "BollaDrawer-1.0-SNAPSHOT.jar",
+MONTH_NAMES = [
+    "Gennaio", "Febbraio", "Marzo", "Aprile", "Maggio", "Giugno",
+    "Luglio", "Agosto", "Settembre", "Ottobre", "Novembre", "Dicembre",
+]
+
+
+@login_required
+def monthly_report_view(request):
+    """
+    Displays the monthly production totals per recipient and lavorazione.
+    Reads only the precomputed MonthlySummary table, never the slips themselves.
+    """
+    years = list(
+        MonthlySummary.objects.values_list("year", flat=True).distinct().order_by("-year")
     )
-    static_files_path = os.path.join(settings.BASE_DIR, "core", "static")
+    filters = get_slip_filters(request.GET)
+    year = filters.get("year") or (years[0] if years else date.today().year)
+
+    summaries = MonthlySummary.objects.filter(year=year).select_related("recipient")
+    if "recipient" in filters:
+        summaries = summaries.filter(recipient_id=filters["recipient"])
+    if "lavorazione" in filters:
+        summaries = summaries.filter(lavorazione=filters["lavorazione"])
+
+    months = []
+    for summary in summaries.order_by("month", "recipient__company_name", "lavorazione"):
+        if not months or months[-1]["month"] != summary.month:
+            months.append({
+                "month": summary.month,
+                "name": MONTH_NAMES[summary.month - 1],
+                "rows": [],
+                "slip_count": 0,
+                "total_quantity": 0,
+            })
+        months[-1]["rows"].append(summary)
+        months[-1]["slip_count"] += summary.slip_count
+        months[-1]["total_quantity"] += summary.total_quantity
 
-    with tempfile.TemporaryDirectory() as temp_dir:
+    context = {
+        "page_title": "Riepilogo Mensile",
+        "year": year,
+        "years": years,
+        "months": months,
+        "totals": summaries.aggregate(
+            slip_count=Sum("slip_count"), total_quantity=Sum("total_quantity")
+        ),
+        "filters": filters,
+        "selected_recipient": get_selected_recipient(filters.get("recipient")),
+        "lavorazioni": LAVORAZIONI,
+    }
+    return render(request, "user_profile/monthly_report.html", context)
 
-        command = ["java", "-jar", jar_path, json_string, temp_dir, static_files_path]
 
-        try:
-            result = subprocess.run(command, check=True, capture_output=True, text=True)
-        except subprocess.CalledProcessError as e:
-            error_message = f"Errore nella generazione del PDF: {e.stderr}"
-            if e.stdout:
-                error_message += f"\nOutput: {e.stdout}"
+@login_required
+def recipient_autocomplete_view(request):
+    """
+    Returns the recipients matching the "q" parameter for the recipient pickers,
+    most recently used first.
+    """
+    try:
+        limit = min(max(int(request.GET.get("limit", AUTOCOMPLETE_LIMIT)), 1), 50)
+    except ValueError:
+        limit = AUTOCOMPLETE_LIMIT
+    return JsonResponse({
+        "results": [
+            {
+                "id": recipient.pk,
+                "company_name": recipient.company_name,
+                "city": recipient.city,
+                "vat_number": recipient.vat_number,
+                "label": f"{recipient.company_name} ({recipient.city})",
+            }
+            for recipient in autocomplete_recipients(request.GET.get("q"), limit)
+        ]
+    })
 
-            messages.error(request, error_message)
-            return redirect("dashboard")
-        # Log stdout/stderr for debugging
-        if result.stdout:
-            print(result.stdout)
-        if result.stderr:
-            print(result.stderr)
-
-        # The jar may write the PDF in different locations or with slightly different
-        # filename formats (for example it may create a "Bolle" subdirectory or
-        # replace characters). Search the temp_dir recursively for a matching PDF
-        # instead of assuming a single fixed path.
-        found_pdf = None
-
-        # Prepare candidate filenames to match (handle variants like '/' vs '-')
-        normalized_full = str(slip.full_slip_number).replace("/", "-")
-        candidates = {
-            f"{slip.full_slip_number}.pdf",
-            f"{normalized_full}.pdf",
-            f"{slip.slip_number}-{slip.slip_year}.pdf",
-            f"{slip.slip_number}_{slip.slip_year}.pdf",
-            f"{slip.slip_number}.{slip.slip_year}.pdf",
-        }
-
-        for root, dirs, files in os.walk(temp_dir):
-            for fname in files:
-                if not fname.lower().endswith(".pdf"):
-                    continue
-                full_path = os.path.join(root, fname)
-                # Exact candidate match or contains both number and year
-                if fname in candidates or (
-                    str(slip.slip_number) in fname and str(slip.slip_year) in fname
-                ):
-                    found_pdf = full_path
-                    break
-            if found_pdf:
-                break
 
-        if found_pdf and os.path.exists(found_pdf):
-            with open(found_pdf, "rb") as f:
-                pdf_content = f.read()
+@login_required
+def item_suggestions_view(request):
+    """
+    Returns the item descriptions starting with the "q" parameter for the slip form,
+    ranked by how often they were used for the "recipient" parameter and overall.
+    """
+    try:
+        recipient_id = int(request.GET.get("recipient") or 0) or None
+    except ValueError:
+        recipient_id = None
+    return JsonResponse({
+        "results": suggest_items(request.GET.get("q"), recipient_id, SUGGESTION_LIMIT)
+    })
+
 
-            disposition = "inline" if request.GET.get("view") else "attachment"
-            # Use a safe filename for Content-Disposition
-            safe_name = f"{normalized_full}.pdf"
-            response = HttpResponse(pdf_content, content_type="application/pdf")
-            response["Content-Disposition"] = (
-                f'{disposition}; filename="{safe_name}"'
-            )
-            return response
-        else:
-            # Collect generated PDFs (if any) for diagnostics
-            generated_pdfs = []
-            for root, dirs, files in os.walk(temp_dir):
-                for fname in files:
-                    if fname.lower().endswith(".pdf"):
-                        generated_pdfs.append(os.path.join(root, fname))
-
-            error_message = "Il file PDF non è stato generato o non è stato trovato."
-            "Controllare i log del server per maggiori dettagli."
-            if result.stdout:
-                error_message += f" Stdout: {result.stdout}"
-            if result.stderr:
-                error_message += f" Stderr: {result.stderr}"
-            if generated_pdfs:
-                error_message += f" PDF trovati: {generated_pdfs}"
-
-            messages.error(request, error_message)
-            return redirect("dashboard")
+def get_selected_recipient(pk):
+    """
+    Returns the recipient shown in a picker, or None.
+    """
+    if not pk:
+        return None
+    return Recipient.objects.only("id", "company_name", "city").filter(pk=pk).first()
 
 
 @login_required
 def recipient_list_view(request):
-    query = request.GET.get("q")
+    """
+    Lists recipients a page at a time, ranked by relevance when searching.
+    """
+    query = (request.GET.get("q") or "").strip()
     if query:
-        recipients = Recipient.objects.filter(
-            company_name__icontains=query
-        ).order_by("company_name")
+        recipients = search_recipients(query)
     else:
         recipients = Recipient.objects.all().order_by(
             "company_name"
         )
+    page = Paginator(recipients, RECIPIENTS_PER_PAGE).get_page(request.GET.get("page"))
 
     context = {
         "page_title": "Gestione Destinatari",
-        "recipients": recipients,
+        "recipients": page.object_list,
+        "page_obj": page,
         "query": query,
     }
     return render(request, "user_profile/recipient_list.html", context)
@@ -604,73 +571,145 @@ def delete_recipient_view(request, pk):
 
 @login_required
 def custom_print_view(request):
+    """
+    Prints slips into a single PDF. The slips are either picked one by one
+    ("selected_slips", a comma-separated list of ids) or given as filters, so
+    a whole range can be printed without listing it in the page first.
+    """
     if request.method == "POST":
         selected_slips_str = request.POST.get("selected_slips")
-        print(selected_slips_str)
-        print(request.POST)
-        if not selected_slips_str:
+        if selected_slips_str:
+            selected_ids = [int(pk) for pk in selected_slips_str.split(",") if pk.strip().isdigit()]
+            selection = Slip.objects.filter(pk__in=selected_ids)
+        else:
+            filters = get_slip_filters(request.POST)
+            selection = filter_slips(Slip.objects.all(), filters).order_by("slip_year", "slip_number")
+            selected_ids = None
+            if not filters:
+                selection = selection.none()
+
+        if selected_ids is not None and len(selected_ids) >= settings.PRINT_JOB_MIN_SLIPS:
+            slips_to_print = None
+        else:
+            # One query; reaching the job threshold means the selection goes to the background
+            slips_to_print = list(
+                selection.select_related("recipient")[:settings.PRINT_JOB_MIN_SLIPS]
+            )
+            if len(slips_to_print) >= settings.PRINT_JOB_MIN_SLIPS:
+                slips_to_print = None
+
+        if slips_to_print is None:
+            if selected_ids is None:
+                selected_ids = list(selection.values_list("pk", flat=True))
+            job = submit_print_job(request.user, selected_ids)
+            messages.info(request, f"Stampa di {len(selected_ids)} bolle avviata in background.")
+            return redirect(f"{reverse('custom_print')}?job={job.pk}")
+
+        if selected_ids is not None:
+            # Keep the order in which the slips were picked
+            position = {pk: index for index, pk in enumerate(selected_ids)}
+            slips_to_print.sort(key=lambda slip: position[slip.pk])
+
+        if not slips_to_print:
             messages.error(request, "Nessuna bolla selezionata.")
             return redirect("custom_print")
-
-        selected_ids = [int(pk) for pk in selected_slips_str.split(",")]
-        slips_to_print = [get_object_or_404(Slip, pk=pk) for pk in selected_ids]
         print(f"Slips to print: {slips_to_print}")
 
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            futures = [executor.submit(generate_slip_pdf, slip) for slip in slips_to_print]
-
-        merger = PdfMerger(strict=False)
-        successful_merges = 0
-
-        for i, future in enumerate(futures):
-            slip = slips_to_print[i]
-            pdf_content = future.result()
-            if pdf_content:
-                try:
-                    pdf_buffer = BytesIO(pdf_content)
-                    pdf_buffer.seek(0)
-                    merger.append(pdf_buffer)
-                    successful_merges += 1
-                    print(f"Successfully added PDF for slip {slip.full_slip_number}")
-                except Exception as e:
-                    print(f"Error adding PDF for slip {slip.full_slip_number}: {e}")
-                    messages.warning(request, f"Impossibile aggiungere il PDF per la bolla {slip.full_slip_number}.")
-            else:
-                print(f"Failed to generate PDF for slip {slip.full_slip_number}")
-                messages.warning(request, f"Impossibile generare il PDF per la bolla {slip.full_slip_number}.")
-
-        if successful_merges > 0:
+        # Cached slips are served from the PDF cache, the others rendered in batches
+        documents = iter_slip_documents(slips_to_print)
+        writer = StreamingPdfWriter()
+        header = writer.start()
+        first_chunk = None
+
+        # Render until the first usable PDF so a total failure can still redirect
+        for slips, pdf_content, failed in documents:
+            numbers = ", ".join(slip.full_slip_number for slip in slips)
+            if failed:
+                print(f"Failed to generate PDF for {failed} of slips {numbers}")
+                messages.warning(request, f"Impossibile generare il PDF per {failed} bolle.")
+            if not pdf_content:
+                continue
             try:
-                output_pdf = BytesIO()
-                merger.write(output_pdf)
-                merger.close()
-                
-                # Reset buffer position to beginning
-                output_pdf.seek(0)
-                pdf_data = output_pdf.getvalue()
-                
-                # Check if we actually have PDF data
-                if len(pdf_data) > 0:
-                    response = HttpResponse(pdf_data, content_type="application/pdf")
-                    response["Content-Disposition"] = 'attachment; filename="bolle_selezionate.pdf"'
-                    return response
-                else:
-                    messages.error(request, "Il PDF generato è vuoto.")
-                    return redirect("custom_print")
-                    
+                first_chunk = header + writer.add_document(pdf_content)
+                print(f"Successfully added PDF for slips {numbers}")
+                break
             except Exception as e:
-                print(f"Error creating merged PDF: {e}")
-                messages.error(request, f"Errore durante la creazione del PDF unito: {e}")
-                return redirect("custom_print")
-        else:
+                print(f"Error adding PDF for slips {numbers}: {e}")
+                messages.warning(request, f"Impossibile aggiungere il PDF per le bolle {numbers}.")
+
+        if first_chunk is None:
+            documents.close()
             messages.error(request, "Nessun PDF è stato generato.")
             return redirect("custom_print")
 
-    slips = Slip.objects.all().order_by("-date", "-slip_number")
-    
+        response = streaming_response(
+            request,
+            stream_merged_slips(writer, first_chunk, documents),
+            content_type="application/pdf",
+        )
+        response["Content-Disposition"] = 'attachment; filename="bolle_selezionate.pdf"'
+        return response
+
+    filters = get_slip_filters(request.GET)
+    slips = filter_slips(
+        Slip.objects.select_related("recipient").only(*DASHBOARD_FIELDS), filters
+    )
+    page = paginate_slips(
+        slips, after=request.GET.get("after"), before=request.GET.get("before")
+    )
+    filter_query = request.GET.copy()
+    for key in ("after", "before", "job"):
+        filter_query.pop(key, None)
+
+    print_jobs = PrintJob.objects.filter(created_by=request.user)[:5]
+    if any(not job.is_finished for job in print_jobs):
+        # Resumes jobs whose runner went away with a restarted process
+        ensure_runner()
+
     context = {
         "page_title": "Stampa Personalizzata",
-        "slips": slips,
+        "slips": page["slips"],
+        "newer_cursor": page["newer_cursor"],
+        "older_cursor": page["older_cursor"],
+        "matching_count": slips.count() if filters else None,
+        "filters": filters,
+        "filter_query": filter_query.urlencode(),
+        "selected_recipient": get_selected_recipient(filters.get("recipient")),
+        "lavorazioni": LAVORAZIONI,
+        "print_jobs": print_jobs,
         "form_data": request.GET,
     }
-    return render(request, "user_profile/custom_print.html", context)
\ No newline at end of file
+    return render(request, "user_profile/custom_print.html", context)
+
+
+def print_job_as_dict(job):
+    return {
+        "id": job.pk,
+        "status": job.status,
+        "status_display": job.get_status_display(),
+        "total": job.total,
+        "processed": job.processed,
+        "failed": job.failed,
+        "error": job.error,
+        "is_finished": job.is_finished,
+        "download_url": reverse("print_job_download", args=[job.pk])
+        if job.status == PrintJob.STATUS_DONE
+        else None,
+    }
+
+
+@login_required
+def print_job_status_view(request, pk):
+    job = get_object_or_404(PrintJob, pk=pk, created_by=request.user)
+    if not job.is_finished:
+        ensure_runner()
+    return JsonResponse(print_job_as_dict(job))
+
+
+@login_required
+def print_job_download_view(request, pk):
+    job = get_object_or_404(PrintJob, pk=pk, created_by=request.user, status=PrintJob.STATUS_DONE)
+    if not job.file_path or not os.path.exists(job.file_path):
+        messages.error(request, "Il file di questa stampa non è più disponibile.")
+        return redirect("custom_print")
+    return ranged_file_response(request, job.file_path, f"bolle_selezionate_{job.pk}.pdf")
\ No newline at end of file